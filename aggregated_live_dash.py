@@ -1,110 +1,354 @@
-# live weather data
-import openmeteo_requests
-import requests_cache
-from retry_requests import retry
-
-# live bus data
-import requests
-import pandas as pd
-import json
-import re
-
-# colour gradient
-import matplotlib.colors as mcolors
+# colour gradient and icons
+from colours import interpolate_colour
+from icons import icons_6x
 
 # dashboard
 import dash
 import dash_bootstrap_components as dbc
 from dash import html, dcc, callback, Input, Output, dash_table
 
+# server push of snapshot updates, and the metrics endpoint
+import json
+from flask import Response, request, g
+from contextlib import contextmanager
+from metrics import MetricsRegistry, size_buckets
+from profiling import Profiler
+
 # launch into dash on script execute
 import subprocess as sp
-from threading import Timer
+from threading import Timer, Lock
 import os
+import time
+import importlib
+
+# retry on error for the weather session
+from requests.adapters import HTTPAdapter
+from urllib3 import Retry
+
+# background data polling
+from data_poller import DataPoller, unchanged
+from shared_snapshot import SharedSnapshotStore, default_snapshot_dir
+from weather_snapshot import decode_weather_responses
+from weather_aggregation import daily_aggregates
+from bus_client import MultiStopBusClient
+from bus_board import DepartureParseError, extract_departure_json, soonest_departures, merge_boards, board_columns
 
 
 # Setup variables
 
-# Setup the Open-Meteo API client with cache and retry on error
-cache_session = requests_cache.CachedSession('.cache', expire_after = 3600)
-retry_session = retry(cache_session, retries = 5, backoff_factor = 0.2)
-openmeteo = openmeteo_requests.Client(session = retry_session)
+# Startup mode. With lazy imports on (the default) the heavy modules below are
+# only imported by the first fetch or callback that needs them, so the server
+# can start serving the page without waiting for them. Set
+# SMART_SCREEN_LAZY_IMPORTS=0 to import everything up front instead.
+# See profile_startup.py for an import-time breakdown of both modes.
+lazy_imports = os.environ.get('SMART_SCREEN_LAZY_IMPORTS', '1') != '0'
+heavy_modules = ['openmeteo_requests', 'requests_cache']
+
+def preload_heavy_modules():
+    for module in heavy_modules:
+        importlib.import_module(module)
+
+# Setup the Open-Meteo API client with cache and retry on error.
+# Built on first use by the weather poller rather than at import time.
+_openmeteo = None
+_openmeteo_cache = None
+_openmeteo_lock = Lock()
+
+def openmeteo_client():
+    global _openmeteo, _openmeteo_cache
+    with _openmeteo_lock:
+        if _openmeteo is None:
+            import openmeteo_requests
+            import requests_cache
+            from http_cache import TieredSQLiteCache
+
+            _openmeteo_cache = TieredSQLiteCache(
+                '.cache',
+                memory_entries = http_cache_memory_entries,
+                flush_interval = http_cache_flush_interval,
+            )
+            # expiry per endpoint instead of one blanket hour
+            cache_session = requests_cache.CachedSession(
+                backend = _openmeteo_cache,
+                expire_after = source_freshness['weather']['ttl'],
+                urls_expire_after = {url.split('://', 1)[-1]: ttl for url, ttl in http_cache_expiry.items()},
+            )
+            # same retry policy retry_requests used to set up, without the dependency
+            retries = Retry(total=5, read=5, connect=5, backoff_factor=0.2,
+                            status_forcelist=(500, 502, 504), allowed_methods=None)
+            adapter = HTTPAdapter(max_retries=retries)
+            cache_session.mount('http://', adapter)
+            cache_session.mount('https://', adapter)
+            cache_session.hooks['response'].append(count_http_cache_result)
+            _openmeteo = openmeteo_requests.Client(session = cache_session)
+        return _openmeteo
+
+# hit/miss counters for each tier of the HTTP cache (empty until first use)
+def http_cache_stats():
+    return _openmeteo_cache.stats() if _openmeteo_cache is not None else {}
 
 # Make sure all required weather variables are listed here
-# The order of variables in hourly or daily is important to assign them correctly below
-weather_url = "https://api.open-meteo.com/v1/forecast"
+# Variables are read back by name from the decoded WeatherSnapshot
+# SMART_SCREEN_WEATHER_URL and SMART_SCREEN_BUS_URL point the app somewhere
+# else, e.g. at fixture_server.py for offline runs.
+weather_url = os.environ.get('SMART_SCREEN_WEATHER_URL', "https://api.open-meteo.com/v1/forecast")
+
+# Every location is fetched in the same Open-Meteo request. A screen shows
+# default_location unless it is opened with ?location=<name> once, which it
+# then remembers.
+locations = {
+	"home": (55.967049727775326, -3.1928189339319695),
+	# "work": (55.9533, -3.1883),
+	# "cottage": (56.3398, -2.7967),
+}
+default_location = "home"
+
 params = {
-	"latitude": 55.967049727775326,
-	"longitude": -3.1928189339319695,
+	"latitude": [latitude for latitude, _ in locations.values()],
+	"longitude": [longitude for _, longitude in locations.values()],
 	"current": ["temperature_2m", "apparent_temperature", "precipitation", "cloud_cover", "wind_speed_10m", "wind_direction_10m"],
     "hourly": "cloud_cover",
 	"daily": ["temperature_2m_max", "temperature_2m_min", "apparent_temperature_max", "apparent_temperature_min", "uv_index_max", "precipitation_sum", "wind_speed_10m_max"],
 	"forecast_days": 2
 }
 
-bus_url = "https://lothianapi.co.uk/departureBoards/website?stops=6200206810"
+bus_url = os.environ.get('SMART_SCREEN_BUS_URL', "https://lothianapi.co.uk/departureBoards/website")
 
+# Stops on the bus board, nearest first, with the label shown in the table.
+# They are fetched concurrently and merged into one board.
+bus_stops = {
+	"6200206810": "Home",
+	# "6200206820": "Other side",
+}
 
-# Setup functions
-# use weather variables to choose background colours of cards
-def interpolate_colour(value,
-                       min_value=0,
-                       max_value=100,
-                       low_gradient = 'lightblue',
-                       high_gradient = 'red'):
-
-    # Normalize the value to be between 0 and 1
-    normalized_value = (value - min_value) / (max_value - min_value)
-
-    # Create color gradients from low to high
-    colour1 = mcolors.to_rgba(low_gradient)
-    colour2 = mcolors.to_rgba(high_gradient)
-
-    interpolated_colour = mcolors.to_hex(
-        [colour1[i] * (1 - normalized_value) + colour2[i] * normalized_value for i in range(4)]
-    )
-    return interpolated_colour
-
-# use weather variables to choose appropriate icons
-def map_temp_to_icon(value):
-    if value < 0:
-        return html.I(className="fa-solid fa-snowflake fa-6x", style={"justifyContent": "center"})
-    elif 0 <= value < 5:
-        return html.I(className="fa-solid fa-temperature-empty fa-6x", style={"justifyContent": "center"})
-    elif 5 <= value < 10:
-        return html.I(className="fa-solid fa-temperature-quarter fa-6x", style={"justifyContent": "center"})
-    elif 10 <= value < 20:
-        return html.I(className="fa-solid fa-temperature-half fa-6x", style={"justifyContent": "center"})
-    elif 20 <= value < 25:
-        return html.I(className="fa-solid fa-temperature-three-quarters fa-6x", style={"justifyContent": "center"})
-    elif 25 <= value < 30:
-        return html.I(className="fa-solid fa-temperature-full fa-6x", style={"justifyContent": "center"})
-    else:
-        return html.P("Get inside!", style={"fontSize": "30px"})
+# Keep-alive session for the bus board, reused by every poll
+bus_client = MultiStopBusClient(bus_url, list(bus_stops), timeout=10, max_workers=4)
+
+# Per-source freshness, in seconds. Each source is refreshed every `ttl`.
+# Screens keep getting the last good value while a refresh runs or fails,
+# until it is more than `max_staleness` old.
+source_freshness = {
+	'weather': {'ttl': 1800, 'max_staleness': 6 * 3600},
+	'bus': {'ttl': 60, 'max_staleness': 10 * 60},
+}
 
-def map_cloud_to_icon(precipitation = 0, cloud_cover = 0):
-    if precipitation < 1:
-        if cloud_cover < 5:
-            return html.I(className="fa-solid fa-sun fa-6x", style={"justifyContent": "center"})
-        elif 5 <= cloud_cover < 25:
-            return html.I(className="fa-solid fa-cloud-sun fa-6x", style={"justifyContent": "center"})
-        else:
-            return html.I(className="fa-solid fa-cloud fa-6x", style={"justifyContent": "center"})
+# Per-endpoint expiry for the on-disk HTTP cache, kept just under the weather
+# TTL so every scheduled refresh reaches Open-Meteo. Expired entries are
+# never served: if Open-Meteo is failing, the poller keeps the last good
+# snapshot, and its age still counts towards max_staleness.
+http_cache_expiry = {
+	weather_url: source_freshness['weather']['ttl'] - 60,
+}
 
-    elif 1 <= precipitation < 2:
-        if cloud_cover < 25:
-            return html.I(className="fa-solid fa-cloud-sun-rain fa-6x", style={"justifyContent": "center"})
-        else:
-            return html.I(className="fa-solid fa-cloud-rain fa-6x", style={"justifyContent": "center"})
+# The HTTP cache keeps hot responses in memory and only writes the SQLite
+# file on the SD card in one batch every http_cache_flush_interval seconds
+# (and at exit). See http_cache.py.
+http_cache_memory_entries = 64
+http_cache_flush_interval = 3600
 
-    elif 2 <= precipitation < 4:
-        return html.I(className="fa-solid fa-cloud-showers-heavy fa-6x", style={"justifyContent": "center"})
+# On-disk size limit for the HTTP cache, enforced every
+# http_cache_maintenance_interval seconds, which also drops expired
+# responses (they are never served again). The file is compacted (VACUUM) once a night during
+# http_cache_quiet_hours (local time, start inclusive, end exclusive).
+http_cache_max_bytes = 8 * 1024 * 1024
+http_cache_maintenance_interval = 3600
+http_cache_quiet_hours = (3, 5)
 
-    elif 4 <= precipitation < 8:
-        return html.I(className="fa-solid fa-cloud-showers-water fa-6x", style={"justifyContent": "center"})
+# The bus page counts down in the browser from absolute departure times
+bus_countdown_interval = 5
+
+# Seconds between keep-alive comments on an idle /events stream
+events_keepalive_interval = 15
+
+# Most /events streams this process keeps open at once. Each holds a server
+# thread, so further screens get a 503 and retry rather than taking the
+# threads callbacks need. Unlimited unless set; gunicorn.conf.py sets it from
+# its thread count.
+max_event_streams = int(os.environ.get('SMART_SCREEN_MAX_EVENT_STREAMS', 0)) or None
 
-    else:
-        return html.P("Get inside!", style={"fontSize": "30px"})
+
+# Setup functions
+
+# use weather variables to choose appropriate icons.
+# One prebuilt component per bucket, sized for this screen.
+map_temp_to_icon = icons_6x.temperature
+map_cloud_to_icon = icons_6x.cloud
+
+# Metrics, served on /metrics in Prometheus text format. Only the
+# histograms and counters below are updated as things happen; everything
+# else is read when /metrics is scraped. Under gunicorn every scrape shows
+# every worker's numbers, labelled by worker pid (see share_snapshots());
+# upstream requests are only seen by the fetching worker.
+metrics = MetricsRegistry()
+upstream_seconds = metrics.histogram('smart_screen_upstream_request_seconds',
+                                     'Upstream request latency by source', 'source')
+upstream_errors = metrics.counter('smart_screen_upstream_errors_total',
+                                  'Failed upstream requests by source', 'source')
+callback_seconds = metrics.histogram('smart_screen_callback_seconds',
+                                     'Dash callback request duration by output ID', 'output')
+callback_bytes = metrics.histogram('smart_screen_callback_response_bytes',
+                                   'Dash callback response size by output ID', 'output', size_buckets)
+http_cache_responses = metrics.counter('smart_screen_http_cache_responses_total',
+                                       'Open-Meteo responses by HTTP cache result', 'result')
+
+@contextmanager
+def upstream_request(source):
+    try:
+        with upstream_seconds.time(source):
+            yield
+    except Exception:
+        upstream_errors.inc(source)
+        raise
+
+# requests_cache response hook: from_cache is only set on the response it returns
+def count_http_cache_result(response, *args, **kwargs):
+    from_cache = getattr(response, 'from_cache', None)
+    if from_cache is not None:
+        http_cache_responses.inc('hit' if from_cache else 'miss')
+
+# On-demand profiling of the fetchers and callbacks, off unless
+# SMART_SCREEN_PROFILE is set or it is switched on at /admin/profiling.
+# See profiling.py for the output and the other settings.
+profiler = Profiler.from_environment()
+
+# Fetch functions run by the background poller, never by the callbacks
+@profiler.profiled()
+def fetch_weather():
+    with upstream_request('weather'):
+        # the timeout applies to each attempt, so a hung connection can't
+        # stall the weather thread for good
+        responses = openmeteo_client().weather_api(weather_url, params=params, timeout=10)
+
+    # One response per location. Decode each once per fetch; every page and
+    # every screen reads the same snapshots
+    return decode_weather_responses(responses, params, list(locations))
+
+# when each stop's page in the last published board was downloaded
+_published_bus_fetch = None
+
+@profiler.profiled()
+def fetch_bus():
+    global _published_bus_fetch
+    # Fetch every stop's page concurrently over the pooled session
+    with upstream_request('bus'):
+        pages = bus_client.fetch_all()
+
+    # The same stops answering with the same bodies (all 304s) make the same
+    # board, so the screens aren't sent it again
+    fetched_at = bus_client.fetched_at(pages)
+    if fetched_at == _published_bus_fetch:
+        return unchanged
+    board = bus_board(pages, fetched_at)
+    _published_bus_fetch = fetched_at
+    return board
+
+# {stop: page text} -> one departure board. `fetched_at` ({stop: unix time})
+# is when each page was downloaded, which its relative minutes count from;
+# a page without one is taken to be fresh.
+def bus_board(pages, fetched_at=None):
+    fetched_at = fetched_at or {}
+    # Single-pass extraction. A stop whose page doesn't parse is left out,
+    # like one that fails to download; only when every page fails is the
+    # first DepartureParseError raised.
+    # The first three departures for each service, merged soonest first
+    boards, errors = [], []
+    for stop, html_content in pages.items():
+        try:
+            data = extract_departure_json(html_content)
+        except DepartureParseError as e:
+            print(f"Failed to parse bus stop {stop}:", e)
+            errors.append(e)
+            continue
+        boards.append(soonest_departures(data, per_service=3, fetched_at=fetched_at.get(stop), stop=bus_stops[stop]))
+    if errors and not boards:
+        raise errors[0]
+
+    # One time-ordered board across all stops, without duplicates
+    return merge_boards(boards)
+
+# Bound and compact the on-disk HTTP cache, and report its footprint
+def maintain_http_cache():
+    openmeteo_client()
+    report = _openmeteo_cache.maintain(
+        max_bytes = http_cache_max_bytes,
+        keep_expired_for = 0,
+        quiet_hours = http_cache_quiet_hours,
+    )
+    vacuum = f", vacuum {report['vacuum_seconds']:.2f}s" if report['vacuum_seconds'] is not None else ""
+    print(f"HTTP cache: {report['entries']} entries, {report['stored_bytes']} bytes stored, "
+          f"{report['file_bytes']} bytes on disk, {report['expired']} expired and "
+          f"{report['evicted']} evicted{vacuum}")
+    return report
+
+# One poller owns the upstream schedules and publishes an in-memory snapshot
+poller = DataPoller()
+poller.add_source('weather', fetch_weather, **source_freshness['weather'])
+poller.add_source('bus', fetch_bus, **source_freshness['bus'])
+poller.add_source('http-cache', maintain_http_cache, ttl=http_cache_maintenance_interval)
+
+# Under a multi-worker server (gunicorn.conf.py) the workers share one set of
+# fetches through files in a snapshot directory: one worker fetches, the
+# others read what it publishes. Their metrics are shared the same way.
+# SMART_SCREEN_SNAPSHOT_DIR sets the directory; by default there is one per
+# `namespace`, the server's bind address.
+def share_snapshots(namespace=""):
+    directory = os.environ.get('SMART_SCREEN_SNAPSHOT_DIR') or default_snapshot_dir(namespace)
+    store = SharedSnapshotStore(directory)
+    poller.share(store)
+    metrics.share(store)
+
+# sources whose versions are pushed to the screens over /events
+screen_sources = ['weather', 'bus']
+
+# Sent with every pushed version, so a screen that reconnects to a restarted
+# server doesn't mistake the new process's versions for ones it has already
+# shown. Set at import, so gunicorn's preloaded workers all share it.
+boot_id = f"{os.getpid():x}{int(time.time()):x}"
+
+# read at scrape time
+def bus_request_totals():
+    totals = {'full': 0, 'not_modified': 0}
+    for client in bus_client.clients.values():
+        totals['not_modified'] += client.totals['not_modified']
+        totals['full'] += client.totals['polls'] - client.totals['not_modified']
+    return totals
+
+# what the bus board validators saved, summed over every stop
+def bus_saved_totals(name):
+    return sum(client.totals[name] for client in bus_client.clients.values())
+
+def http_cache_footprint():
+    report = poller.latest('http-cache')
+    if report is None:
+        return None
+    return {name: report[name] for name in ('stored_bytes', 'file_bytes')}
+
+metrics.collected('smart_screen_http_cache_tier_total', 'HTTP cache memory/disk tier events', 'counter',
+                  lambda: {name: value for name, value in http_cache_stats().items() if name != 'pending'}, 'event')
+metrics.collected('smart_screen_http_cache_pending_writes', 'HTTP cache writes waiting for the next flush', 'gauge',
+                  lambda: http_cache_stats().get('pending'))
+metrics.collected('smart_screen_http_cache_bytes', 'HTTP cache size on disk at the last maintenance pass', 'gauge',
+                  http_cache_footprint, 'kind')
+metrics.collected('smart_screen_bus_requests_total', 'Bus board requests by response', 'counter',
+                  bus_request_totals, 'response')
+metrics.collected('smart_screen_bus_saved_bytes_total', 'Bus board bytes not downloaded thanks to 304 responses',
+                  'counter', lambda: bus_saved_totals('bytes_saved'))
+metrics.collected('smart_screen_bus_saved_seconds_total', 'Bus board download time saved by 304 responses',
+                  'counter', lambda: bus_saved_totals('seconds_saved'))
+metrics.collected('smart_screen_snapshot_age_seconds', 'Seconds since each source was last published', 'gauge',
+                  lambda: {name: poller.age(name) for name in poller.versions()}, 'source')
+metrics.collected('smart_screen_snapshot_version', 'Publish counter of each source', 'counter',
+                  poller.versions, 'source')
+
+# The client itself, with its SQLite connection, is still built by the first
+# fetch, so a server that preloads this module can fork safely (see wsgi.py)
+if not lazy_imports:
+    preload_heavy_modules()
+
+# how long callbacks wait for the very first fetch after a cold start. Only
+# the first fetch is waited for; if it fails, screens show placeholders until
+# a later one succeeds.
+cold_start_timeout = 30
 
 # Function to open the browser after the Dash server starts
 def open_fullscreen_browser():
@@ -115,13 +359,30 @@ def open_fullscreen_browser():
         sp.Popen(['chromium-browser', '--kiosk', 'http://127.0.0.1:8050/'], shell=True)
 
 
+# Serve the self-hosted bundle from assets/vendor once build_assets.py has
+# been run, otherwise fall back to the CDN stylesheets
+vendor_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'vendor')
+vendored_assets = all(os.path.exists(os.path.join(vendor_dir, name))
+                      for name in ('bootstrap.min.css', 'fontawesome-subset.css'))
+external_stylesheets = [] if vendored_assets else [dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME]
+
 # Dash setup
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME], suppress_callback_exceptions=True)
+app = dash.Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
+
+# Asset URLs carry Dash's ?m= fingerprint and the font a content hash,
+# so the browser can keep them for a year
+app.server.config['SEND_FILE_MAX_AGE_DEFAULT'] = 31536000
 
 # Define the layout of the app
 app.layout = dbc.Container(
     [
         dcc.Location(id='url', refresh=False, pathname='/page-1'),
+        # Snapshot versions pushed over /events by assets/snapshot_events.js.
+        # Page callbacks listen to these instead of polling on a timer.
+        dcc.Store(id='weather-version'),
+        dcc.Store(id='bus-version'),
+        # which location's weather this screen shows, kept across reloads
+        dcc.Store(id='location', storage_type='local'),
         dbc.NavbarSimple(
             children=[
                 dbc.NavItem(dbc.NavLink("Today's Weather", href="/page-1"), style={"marginRight": "10px"}),
@@ -177,179 +438,236 @@ app.layout = dbc.Container(
     fluid=True
 )
 
+# The weather cards are laid out once with stable ids. Callbacks only send
+# the leaf properties that change: card colours, text and icons.
+temp_card = html.Div(
+    [
+        dbc.Card(
+            dbc.CardBody(
+                [
+                    html.H1("Temperature", className="text-center"),
+                    html.P(
+                        [
+                            html.Br(),  # Line break
+                            html.Span(id='temp-ambient'),
+                            html.Br(),  # Line break
+                            html.Br(),  # Line break
+                            html.Span(id='temp-real-feel'),
+                        ],
+                        style={"fontSize": "24px"},  # Smaller text size for temperature details
+                        className="card-text",
+                    ),
+                    # Add the icon outside the <P> element for better control
+                    html.Div(
+                        id='temp-icon',
+                        style={
+                            "textAlign": "center",  # Center the icon horizontally
+                            "marginTop": "24px"  # Add some space above the icon
+                        }
+                    ),
+                ]
+            ),
+            id='temp-card',
+            className="w-100 mb-1",  # fills the available width. has a margin on the bottom
+        )
+    ],
+    style={"height": "90vh"},  # Set the height of the container to 95% of viewport height
+    className="d-flex align-items-stretch"
+)
+
+rain_card = html.Div(
+    [
+        dbc.Card(
+            dbc.CardBody(
+                [
+                    html.H1("Precipitation", className="text-center"),
+                    html.P(
+                        [
+                            html.Br(),  # line break
+                            html.Span(id='rain-fall'),
+                            html.Br(),  # line break
+                            html.Br(),  # line break
+                            html.Span(id='rain-cloud-cover'),
+                        ],
+                        style={"fontSize": "24px"},
+                        className="card-text",
+                    ),
+                    # Add the icon outside the <P> element for better control
+                    html.Div(
+                        id='rain-icon',
+                        style={
+                            "textAlign": "center",  # Center the icon horizontally
+                            "marginTop": "20px"  # Add some space above the icon
+                        }
+                    ),
+                ]
+            ),
+            id='rain-card',
+            className="w-100 mb-1",
+        )
+    ],
+    style={"height": "90vh"},  # Set the height of the container to 100% of the viewport height
+    className="d-flex align-items-stretch"
+)
+
 page_1_layout = html.Div([
     dbc.Row([
-        # First Interval and Div
-        dcc.Interval(
-            id='interval-component-1',
-            interval=1800*1000,  # 1000 milliseconds = 1 second. half-hourly
-            n_intervals=0
-        ),
-        dbc.Col(html.Div(id='live-update-text-1')),
+        dbc.Col(temp_card),
+        dbc.Col(rain_card)
     ]),
 ])
 
 # Second page layout
+# Tomorrow's forecast table, refreshed by sending only its rows
+weather_forecast_card = html.Div(
+    [
+        dbc.Card(
+            dbc.CardBody(
+                [
+                    html.H1("Tomorrow's Weather", className="text-center", style={'color': 'white'}),
+                    dash_table.DataTable(
+                        id='forecast-table',
+                        columns=[
+                            {"name": "", "id": "Metric"},
+                            {"name": "", "id": "Value"}
+                        ],
+                        style_table={'overflowX': 'auto', 'backgroundColor': 'rgba(0, 0, 0, 0)'},
+                        style_cell={'textAlign': 'left', 'padding': '10px', 'backgroundColor': 'rgba(0, 0, 0, 0)', 'border': 'none'},
+                        style_header={'display': 'none'},
+                        style_data={'backgroundColor': 'rgba(0, 0, 0, 0)', 'color': 'white', 'fontSize': '24px'}
+                    )
+                ]
+            ),
+            color= 'rgb(50,50,50)',
+            className="w-100 mb-1",  # fills the available width. has a margin on the bottom
+        )
+    ],
+    style={"height": "90vh"},  # Set the height of the container to 95% of viewport height
+    className="d-flex align-items-stretch"
+)
+
 page_2_layout = html.Div([
-    dcc.Interval(
-            id='interval-component-2',
-            interval=10800*1000,  # 1000 milliseconds = 1 second. 3-hour intervals
-            n_intervals=0
-        ),
-        dbc.Col(html.Div(id='live-update-text-2')),
+        dbc.Col(weather_forecast_card),
 ])
 
 # Tird page layout
 page_3_layout = html.Div([
-    dcc.Interval(
-            id='interval-component-3',
-            interval=60*1000,  # 1000 milliseconds = 1 second. 1 minute intervals
+        # ticks the countdown in the browser only, no server round trip
+        dcc.Interval(
+            id='bus-countdown-interval',
+            interval=bus_countdown_interval*1000,
             n_intervals=0
         ),
-        dbc.Col(html.Div(id='live-update-text-3')),
+        dcc.Store(id='bus-store'),
+        dbc.Col(html.Div(
+            [
+                dbc.Card(
+                    [
+                        dbc.CardBody(
+                            dash_table.DataTable(
+                                id='bus-table',
+                                columns=board_columns(include_stop=len(bus_stops) > 1),
+                                data=[],
+                                style_table={'overflowX': 'auto', 'backgroundColor': 'rgba(0, 0, 0, 0)'},
+                                style_cell={'textAlign': 'left', 'padding': '10px', 'backgroundColor': 'rgba(0, 0, 0, 0)', 'border': 'none'},
+                                style_header={'backgroundColor': 'rgb(30, 30, 30)', 'color': 'white', "fontSize": "20px"},
+                                style_data={'backgroundColor': 'rgb(50, 50, 50)', 'color': 'white', "fontSize": "30px"},
+                            )
+                        )
+                    ],
+                    style={"width": "100%"},
+                    color='rgb(50, 50, 50)'
+                )
+            ],
+            style={"height": "90vh"},
+            className="d-flex align-items-stretch"
+        )),
 ])
 
-# Callback for the first interval
-@app.callback(
-    Output('live-update-text-1', 'children'),
-    Input('interval-component-1', 'n_intervals')
+# Remember ?location=<name> from the URL for this screen (runs in the browser)
+app.clientside_callback(
+    """
+    function(search) {
+        const location = new URLSearchParams(search || '').get('location');
+        return location || window.dash_clientside.no_update;
+    }
+    """,
+    Output('location', 'data'),
+    Input('url', 'search')
 )
-def update_text_1(n):
-    responses = openmeteo.weather_api(weather_url, params=params)
-
-    # Process first location. Add a for-loop for multiple locations or weather models
-    response = responses[0]
-
-    # Current values. The order of variables needs to be the same as requested.
-    current = response.Current()
-    current_temperature_2m = int(current.Variables(0).Value())
-    current_apparent_temperature = int(current.Variables(1).Value())
-    current_precipitation = int(current.Variables(2).Value())
-    current_cloud_cover = int(current.Variables(3).Value())
-    #current_wind_speed_10m = current.Variables(4).Value()
-    #current_wind_direction_10m = current.Variables(5).Value()
-
-    temp_card = html.Div(
-        [
-            dbc.Card(
-                dbc.CardBody(
-                    [
-                        html.H1("Temperature", className="text-center"),
-                        html.P(
-                            [
-                                html.Br(),  # Line break
-                                f"Ambient temp: {current_temperature_2m}°C",
-                                html.Br(),  # Line break
-                                html.Br(),  # Line break
-                                f"Real-feel: {current_apparent_temperature}°C",
-                            ],
-                            style={"fontSize": "24px"},  # Smaller text size for temperature details
-                            className="card-text",
-                        ),
-                        # Add the icon outside the <P> element for better control
-                        html.Div(
-                            map_temp_to_icon(current_temperature_2m),
-                            style={
-                                "textAlign": "center",  # Center the icon horizontally
-                                "marginTop": "24px"  # Add some space above the icon
-                            }
-                        ),
-                    ]
-                ),
-                color=interpolate_colour(current_temperature_2m, 0, 40, "lightblue", "red"),
-                className="w-100 mb-1",  # fills the available width. has a margin on the bottom
-            )
-        ],
-        style={"height": "90vh"},  # Set the height of the container to 95% of viewport height
-        className="d-flex align-items-stretch"
-    )
 
-    rain_card = html.Div(
-        [
-            dbc.Card(
-                dbc.CardBody(
-                    [
-                        html.H1("Precipitation", className="text-center"),
-                        html.P(
-                            [
-                                html.Br(),  # line break
-                                f"Rainfall: {current_precipitation}mm",
-                                html.Br(),  # line break
-                                html.Br(),  # line break
-                                f"Cloud Cover: {current_cloud_cover}%",
-                            ],
-                            style={"fontSize": "24px"},
-                            className="card-text",
-                        ),
-                        # Add the icon outside the <P> element for better control
-                        html.Div(
-                            map_cloud_to_icon(current_precipitation, current_cloud_cover),
-                            style={
-                                "textAlign": "center",  # Center the icon horizontally
-                                "marginTop": "20px"  # Add some space above the icon
-                            }
-                        ),
-                    ]
-                ),
-                color=interpolate_colour(current_precipitation, 0, 10,
-                                         "skyblue", "dimgrey"),
-                className="w-100 mb-1",
-            )
-        ],
-        style={"height": "90vh"},  # Set the height of the container to 100% of the viewport height
-        className="d-flex align-items-stretch"
-    )
+# Weather snapshot for the screen's location, falling back to the default
+def location_weather(location):
+    snapshots = poller.latest('weather', timeout=cold_start_timeout)
+    if snapshots is None:
+        return None
+    return snapshots.get(location) or snapshots.get(default_location)
 
-    hourly_weather_card = dbc.Row(
-        [
-            dbc.Col(temp_card),
-            dbc.Col(rain_card)
-        ]
+# Callback for the first page, run when the page opens, new weather is pushed
+# or the screen's location changes
+@app.callback(
+    Output('temp-card', 'color'),
+    Output('temp-ambient', 'children'),
+    Output('temp-real-feel', 'children'),
+    Output('temp-icon', 'children'),
+    Output('rain-card', 'color'),
+    Output('rain-fall', 'children'),
+    Output('rain-cloud-cover', 'children'),
+    Output('rain-icon', 'children'),
+    Input('weather-version', 'data'),
+    Input('location', 'data')
+)
+def update_text_1(n, location):
+    weather = location_weather(location)
+    if weather is None:
+        # nothing fetched yet, or too stale to show
+        return (None, "Ambient temp: --°C", "Real-feel: --°C", None,
+                None, "Rainfall: --mm", "Cloud Cover: --%", None)
+
+    # Current values
+    current = weather.current
+    current_temperature_2m = int(current["temperature_2m"])
+    current_apparent_temperature = int(current["apparent_temperature"])
+    current_precipitation = int(current["precipitation"])
+    current_cloud_cover = int(current["cloud_cover"])
+    #current_wind_speed_10m = current["wind_speed_10m"]
+    #current_wind_direction_10m = current["wind_direction_10m"]
+
+    return (
+        interpolate_colour(current_temperature_2m, 0, 40, "lightblue", "red"),
+        f"Ambient temp: {current_temperature_2m}°C",
+        f"Real-feel: {current_apparent_temperature}°C",
+        map_temp_to_icon(current_temperature_2m),
+        interpolate_colour(current_precipitation, 0, 10, "skyblue", "dimgrey"),
+        f"Rainfall: {current_precipitation}mm",
+        f"Cloud Cover: {current_cloud_cover}%",
+        map_cloud_to_icon(current_precipitation, current_cloud_cover),
     )
-    return hourly_weather_card
 
 @app.callback(
-    Output('live-update-text-2', 'children'),
-    Input('interval-component-2', 'n_intervals')
+    Output('forecast-table', 'data'),
+    Input('weather-version', 'data'),
+    Input('location', 'data')
 )
-def update_text_2(n):
-    responses = openmeteo.weather_api(weather_url, params=params)
-
-    # Process first location. Add a for-loop for multiple locations or weather models
-    response = responses[0]
-
-    # Current values. The order of variables needs to be the same as requested.
-    daily = response.Daily()
-    daily_temperature_2m_max = int(daily.Variables(0).ValuesAsNumpy()[1])
-    daily_temperature_2m_min = int(daily.Variables(1).ValuesAsNumpy()[1])
-    daily_apparent_temperature_max = int(daily.Variables(2).ValuesAsNumpy()[1])
-    daily_apparent_temperature_min = int(daily.Variables(3).ValuesAsNumpy()[1])
-    daily_uv_index_max = int(daily.Variables(4).ValuesAsNumpy()[1])
-    daily_precipitation_sum = int(daily.Variables(5).ValuesAsNumpy()[1])
-    daily_wind_speed_10m_max = int(daily.Variables(6).ValuesAsNumpy()[1])
-
-    # Process hourly data. The order of variables needs to be the same as requested.
-    hourly = response.Hourly()
-    hourly_cloud_cover = hourly.Variables(0).ValuesAsNumpy()
-
-    # Get the time stamps of your forecasted data
-    hourly_data = {"date": pd.date_range(
-        start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-        end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-        freq=pd.Timedelta(seconds=hourly.Interval()),
-        inclusive="left"
-    )}
-
-    # convert lists of times and cloud cover to dataframe
-    hourly_data["cloud_cover"] = hourly_cloud_cover
-    hourly_dataframe = pd.DataFrame(data=hourly_data)
-
-    # Set the datetime column as the index
-    hourly_dataframe.set_index("date", inplace=True)
-
-    # Calculate daily mean cloud cover
-    daily_mean = hourly_dataframe.resample('D').mean()
-    daily_cloud_cover = int(daily_mean["cloud_cover"].iloc[1])
+def update_text_2(n, location):
+    weather = location_weather(location)
+    if weather is None:
+        return []
+
+    # Tomorrow's daily values
+    daily = weather.daily
+    daily_temperature_2m_max = int(daily["temperature_2m_max"][1])
+    daily_temperature_2m_min = int(daily["temperature_2m_min"][1])
+    daily_apparent_temperature_max = int(daily["apparent_temperature_max"][1])
+    daily_apparent_temperature_min = int(daily["apparent_temperature_min"][1])
+    daily_uv_index_max = int(daily["uv_index_max"][1])
+    daily_precipitation_sum = int(daily["precipitation_sum"][1])
+    daily_wind_speed_10m_max = int(daily["wind_speed_10m_max"][1])
+
+    # Calculate tomorrow's mean cloud cover from the hourly data
+    hourly_daily = daily_aggregates(weather.hourly_time, weather.hourly_interval,
+                                    weather.hourly, weather.utc_offset_seconds)
+    daily_cloud_cover = int(hourly_daily["cloud_cover"]["mean"][1])
 
     # Prepare the data for the DataTable
     weather_data = [
@@ -361,102 +679,151 @@ def update_text_2(n):
         {"Metric": "UV index", "Value": f"{daily_uv_index_max}"}
     ]
 
-    # Define the DataTable
-    weather_forecast_card = html.Div(
-        [
-            dbc.Card(
-                dbc.CardBody(
-                    [
-                        html.H1("Tomorrow's Weather", className="text-center", style={'color': 'white'}),
-                        dash_table.DataTable(
-                            columns=[
-                                {"name": "", "id": "Metric"},
-                                {"name": "", "id": "Value"}
-                            ],
-                            data=weather_data,
-                            style_table={'overflowX': 'auto', 'backgroundColor': 'rgba(0, 0, 0, 0)'},
-                            style_cell={'textAlign': 'left', 'padding': '10px', 'backgroundColor': 'rgba(0, 0, 0, 0)', 'border': 'none'},
-                            style_header={'display': 'none'},
-                            style_data={'backgroundColor': 'rgba(0, 0, 0, 0)', 'color': 'white', 'fontSize': '24px'}
-                        )
-                    ]
-                ),
-                color= 'rgb(50,50,50)',
-                className="w-100 mb-1",  # fills the available width. has a margin on the bottom
-            )
-        ],
-        style={"height": "90vh"},  # Set the height of the container to 95% of viewport height
-        className="d-flex align-items-stretch"
-    )
-
-    return weather_forecast_card
+    return weather_data
 
+# Server side of the bus page: hand the browser absolute departure times
+# and the server clock, so it can work out the countdown by itself.
+# Runs when the page opens or a new board is pushed.
 @app.callback(
-    Output('live-update-text-3', 'children'),
-    Input('interval-component-3', 'n_intervals')
+    Output('bus-store', 'data'),
+    Input('bus-version', 'data')
 )
 def update_text_3(n):
-    # Fetch the page content
-    response = requests.get(bus_url)
-    html_content = response.text
-
-    # Print a snippet of the HTML content to confirm it's fetched correctly
-    # print(html_content[:2000])  # Print the first 2000 characters
-
-    json_match = re.search(r'{.*}', html_content, re.DOTALL)
-    json_data = json_match.group(0)
-
-    # print(json_data)
+    departures = poller.latest('bus', timeout=cold_start_timeout)
+    if departures is None:
+        # nothing fetched yet, or too stale to trust
+        departures = []
+
+    return {
+        "server_time": time.time(),
+        "rows": [departure.as_row() for departure in departures],
+    }
+
+# Browser side of the bus page: recompute the minutes to departure from the
+# stored departure times every few seconds and drop buses that have left.
+# The server/browser clock offset is taken each time a new board arrives.
+app.clientside_callback(
+    """
+    function(n, board) {
+        if (!board) {
+            return window.dash_clientside.no_update;
+        }
+        const triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+        if (triggered.includes('bus-store.data') || window.busClockOffset === undefined) {
+            window.busClockOffset = board.server_time - Date.now() / 1000;
+        }
+        const now = Date.now() / 1000 + window.busClockOffset;
+        return board.rows
+            .filter(row => row.departure_unix > now - 30)
+            .map(row => Object.assign({}, row, {
+                'Mins to Departure': Math.max(0, Math.floor((row.departure_unix - now) / 60))
+            }));
+    }
+    """,
+    Output('bus-table', 'data'),
+    Input('bus-countdown-interval', 'n_intervals'),
+    Input('bus-store', 'data')
+)
 
-    # Parse and print the JSON data if found
-    if json_data:
+# Time every callback request and record its response size, by output ID
+@app.server.before_request
+def start_callback_timer():
+    if request.path.endswith('/_dash-update-component'):
+        g.callback_start = time.perf_counter()
+
+@app.server.after_request
+def record_callback(response):
+    start = g.pop('callback_start', None)
+    if start is not None:
+        # only outputs of registered callbacks become labels, so a client
+        # can't create new series by posting made-up ones
+        output = (request.get_json(silent=True) or {}).get('output')
+        if not isinstance(output, str) or output not in app.callback_map:
+            output = 'unknown'
+        callback_seconds.observe(output, time.perf_counter() - start)
+        callback_bytes.observe(output, response.calculate_content_length() or 0)
+    return response
+
+@app.server.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.content_type)
+
+# Profile whole callback requests, so serialising the output is included.
+# Each is profiled under its callback's function name.
+@app.server.before_request
+def start_callback_profile():
+    if profiler.enabled and request.path.endswith('/_dash-update-component'):
+        output = (request.get_json(silent=True) or {}).get('output')
+        callback = app.callback_map.get(output, {}).get('callback')
+        g.callback_profile = profiler.start(getattr(callback, '__name__', None) or str(output))
+
+@app.server.after_request
+def stop_callback_profile(response):
+    session = g.pop('callback_profile', None)
+    if session is not None:
+        profiler.stop(session)
+    return response
+
+# Switch profiling on or off at runtime, from the kiosk itself only:
+#   curl -X POST 'http://127.0.0.1:8050/admin/profiling?mode=sample&targets=update_text_2,fetch_weather'
+#   curl -X POST 'http://127.0.0.1:8050/admin/profiling?mode=off'
+# Under gunicorn this only reaches the worker that serves the request;
+# use SMART_SCREEN_PROFILE to profile every worker.
+@app.server.route('/admin/profiling', methods=['GET', 'POST'])
+def profiling_admin():
+    if request.remote_addr not in ('127.0.0.1', '::1'):
+        return Response('Forbidden', status=403)
+    if request.method == 'POST':
+        mode = request.values.get('mode', 'off')
+        targets = request.values.get('targets')
         try:
-            data = json.loads(json_data)
-            #print(json.dumps(data, indent=4))
-        except json.JSONDecodeError as e:
-            print("Failed to parse JSON data:", e)
-    else:
-        print("No JSON data found.")
-
-    # Extracting the first two departure times for each service
-    bus_services = []
-    for service in data['services']:
-        service_name = service['service_name']
-        departures = service['departures'][:3]  # Get the first two departures
-        for departure in departures:
-            bus_services.append({
-                'Bus': service_name,
-                'Mins to Departure': departure['minutes'],
-                'Departure Time': departure['departure_time']
-            })
-
-    # Creating a DataFrame for easy display
-    df = pd.DataFrame(bus_services).sort_values(by = ['Mins to Departure'], ascending=True)
-
-    bus_card = html.Div(
-        [
-            dbc.Card(
-                [
-                    dbc.CardBody(
-                        dash_table.DataTable(
-                            columns=[{"name": i, "id": i} for i in df.columns],
-                            data=df.to_dict('records'),
-                            style_table={'overflowX': 'auto', 'backgroundColor': 'rgba(0, 0, 0, 0)'},
-                            style_cell={'textAlign': 'left', 'padding': '10px', 'backgroundColor': 'rgba(0, 0, 0, 0)', 'border': 'none'},
-                            style_header={'backgroundColor': 'rgb(30, 30, 30)', 'color': 'white', "fontSize": "20px"},
-                            style_data={'backgroundColor': 'rgb(50, 50, 50)', 'color': 'white', "fontSize": "30px"},
-                        )
-                    )
-                ],
-                style={"width": "100%"},
-                color='rgb(50, 50, 50)'
-            )
-        ],
-    style = {"height": "90vh"},
-    className = "d-flex align-items-stretch"
-    )
-
-    return bus_card
+            profiler.configure(None if mode == 'off' else mode,
+                               targets.split(',') if targets else None)
+        except ValueError as e:
+            return Response(str(e), status=400)
+    return Response(json.dumps(profiler.status()), mimetype='application/json')
+
+# /events streams open in this process
+_event_streams = 0
+_event_streams_lock = Lock()
+
+def release_event_stream():
+    global _event_streams
+    with _event_streams_lock:
+        _event_streams -= 1
+
+# Server-Sent Events stream: one message with the per-source snapshot
+# versions on connect, then one each time a screen source publishes
+# something new or goes past its max_staleness. A source that stops updating
+# is noticed at the next keep-alive, and its screens re-run their callbacks
+# to show the placeholders.
+@app.server.route('/events')
+def snapshot_events():
+    global _event_streams
+    with _event_streams_lock:
+        if max_event_streams is not None and _event_streams >= max_event_streams:
+            return Response('Too many screens connected', status=503,
+                            headers={'Retry-After': str(events_keepalive_interval)})
+        _event_streams += 1
+
+    def stream():
+        versions, sent = None, None
+        while True:
+            versions = poller.wait_for_update(versions, timeout=events_keepalive_interval)
+            screen_versions = {name: f"{boot_id}-{versions[name]}" + ("-stale" if poller.stale(name) else "")
+                               for name in screen_sources}
+            if screen_versions != sent:
+                sent = screen_versions
+                yield f"data: {json.dumps(sent)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # the server closes the response once the screen has gone (noticed at the
+    # next keep-alive at the latest), which frees the slot
+    response.call_on_close(release_event_stream)
+    return response
 
 # Multi-page callback to update content and arrows
 @app.callback(
@@ -481,8 +848,12 @@ def display_page(pathname):
     else:
         return "404 Page Not Found", '/', '/'
 
+# Development server, single process with the debugger on. For several
+# screens use the production entry point instead:
+#   gunicorn -c gunicorn.conf.py wsgi:server
 if __name__ == '__main__':
+    poller.start()  # upstream fetches run in the background from here on
     Timer(2,
           open_fullscreen_browser).start()  # Note no parentheses here
-    #app.run_server(debug=True, host='127.0.0.1', port=8050, use_reloader=False)  # Starts the Dash app
-    app.run_server(host='0.0.0.0', port=8050, debug=True, use_reloader=False)
\ No newline at end of file
+    #app.run(debug=True, host='127.0.0.1', port=8050, use_reloader=False)  # Starts the Dash app
+    app.run(host='0.0.0.0', port=8050, debug=True, use_reloader=False)
\ No newline at end of file
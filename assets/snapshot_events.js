@@ -0,0 +1,44 @@
+// Listen for snapshot notifications pushed by the server over Server-Sent
+// Events and copy each source's version into its "<source>-version" store.
+// Page callbacks take those stores as inputs, so they only run when the
+// poller has actually published new data.
+(function () {
+    var seen = {};
+    var pending = null;
+
+    function apply() {
+        if (!pending) {
+            return;
+        }
+        if (!(window.dash_clientside && window.dash_clientside.set_props)) {
+            // the Dash renderer is not up yet, try again shortly
+            setTimeout(apply, 250);
+            return;
+        }
+        Object.keys(pending).forEach(function (source) {
+            if (seen[source] !== pending[source]) {
+                seen[source] = pending[source];
+                window.dash_clientside.set_props(source + '-version', {data: pending[source]});
+            }
+        });
+        pending = null;
+    }
+
+    function connect() {
+        var events = new EventSource('/events');
+        events.onmessage = function (event) {
+            pending = JSON.parse(event.data);
+            apply();
+        };
+        // EventSource reconnects by itself when a stream drops, but gives up
+        // on an error response, e.g. a 503 from a server with every stream
+        // slot taken, so try again a little later
+        events.onerror = function () {
+            if (events.readyState === EventSource.CLOSED) {
+                setTimeout(connect, 5000 + Math.random() * 5000);
+            }
+        };
+    }
+
+    connect();
+})();
@@ -0,0 +1,61 @@
+# Micro-benchmark: bounded single-pass extractor vs the old greedy DOTALL regex.
+# Run from the repository root:  python -m benchmarks.bench_bus_extract
+import json
+import re
+import timeit
+
+from bus_board import extract_departure_json
+
+
+# A departure board with `n_services` services, wrapped in an HTML page,
+# optionally with a stylesheet brace block before the payload
+def make_page(n_services, padding_lines=0, stylesheet=False):
+    data = {"services": [
+        {
+            "service_name": str(i),
+            "destination": "Ocean Terminal",
+            "departures": [{"minutes": m, "departure_time": f"12:{m:02d}"} for m in range(0, 60, 7)],
+        }
+        for i in range(n_services)
+    ]}
+    filler = "<p>Lothian departures</p>\n" * padding_lines
+    return (
+        "<html><head>" + ("<style>body { margin: 0 }</style>" if stylesheet else "") + "</head><body>\n"
+        + filler
+        + json.dumps(data)
+        + "\n" + filler
+        + "</body></html>"
+    )
+
+
+# what update_text_3 used to do
+def regex_extract(text):
+    json_match = re.search(r'{.*}', text, re.DOTALL)
+    return json.loads(json_match.group(0))
+
+
+def plain_json_page(n_services):
+    return json.dumps({"services": json.loads(make_page(n_services).split("\n")[1])["services"]})
+
+
+def bench(func, text, number):
+    return min(timeit.repeat(lambda: func(text), number=number, repeat=5)) / number * 1e6
+
+
+if __name__ == "__main__":
+    print(f"{'page':>14} {'bytes':>9} {'regex us':>10} {'extract us':>11}")
+    for n_services, padding in [(3, 0), (10, 10), (30, 100), (100, 1000), (300, 10000)]:
+        pages = [
+            ("json", plain_json_page(n_services)),
+            ("html", make_page(n_services, padding)),
+            ("html+css", make_page(n_services, padding, stylesheet=True)),
+        ]
+        for label, text in pages:
+            number = max(1, 20000 // len(text))
+            try:
+                regex_us = f"{bench(regex_extract, text, number):10.1f}"
+            except json.JSONDecodeError:
+                # the greedy match spans the stylesheet braces as well
+                regex_us = f"{'fails':>10}"
+            extract_us = bench(extract_departure_json, text, number)
+            print(f"{label + ' x' + str(n_services):>14} {len(text):9d} {regex_us} {extract_us:11.1f}")
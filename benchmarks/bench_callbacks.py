@@ -0,0 +1,193 @@
+# Callback benchmark: wall time, peak allocations and JSON payload size of
+# every server-side Dash callback, checked against a stored baseline.
+#
+# The callbacks read the poller's snapshot, so the inputs are published into
+# it directly: recorded upstream responses when a fixture directory from
+# fixture_server.py is given, otherwise a fixed synthetic forecast and board.
+# Exits non-zero when any metric is worse than its baseline by more than the
+# tolerance. Timings are only comparable on the machine that wrote the baseline.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_callbacks                     # synthetic inputs
+#   python -m benchmarks.bench_callbacks --fixtures fixtures
+#   python -m benchmarks.bench_callbacks --update-baseline
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from urllib.parse import parse_qs
+
+import numpy as np
+from plotly.io.json import to_json_plotly
+
+import aggregated_live_dash as app
+from fixture_server import load_manifest
+from weather_snapshot import WeatherSnapshot, decode_weather_responses, variable_names
+
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "callback_baseline.json")
+
+# allowed relative regression per metric, and the absolute difference below
+# which a change is treated as noise. Payloads carrying a timestamp (the bus
+# board's server_time) vary by a few bytes from call to call.
+default_tolerance = {"median_ms": 0.3, "p95_ms": 0.5, "peak_alloc_kib": 0.2, "payload_bytes": 0.0}
+noise = {"median_ms": 0.05, "p95_ms": 0.05, "peak_alloc_kib": 1.0, "payload_bytes": 8}
+
+
+# a fixed two-day forecast for every configured location
+def synthetic_weather(start_time=1_700_006_400):
+    hours = 24 * app.params["forecast_days"]
+    hourly = {name: np.linspace(10, 90, hours, dtype=np.float32) for name in variable_names(app.params, "hourly")}
+    daily = {name: np.array([12.4, 15.6], dtype=np.float32) for name in variable_names(app.params, "daily")}
+    current = {name: 11.5 for name in variable_names(app.params, "current")}
+    snapshot = WeatherSnapshot(
+        latitude=55.97, longitude=-3.19, utc_offset_seconds=0,
+        current_time=start_time, current=current,
+        daily_time=start_time, daily_interval=86400, daily=daily,
+        hourly_time=start_time, hourly_interval=3600, hourly=hourly,
+    )
+    return {name: snapshot for name in app.locations}
+
+
+# one page per configured stop: ten services with four departures each
+def synthetic_bus_pages(now):
+    services = [
+        {
+            "service_name": str(service),
+            "destination": "Ocean Terminal",
+            "departures": [
+                {"minutes": minutes, "departure_time": time.strftime("%H:%M", time.localtime(now + 60 * minutes)),
+                 "departure_time_unix": now + 60 * minutes}
+                for minutes in range(service % 7, 60, 15)
+            ],
+        }
+        for service in range(10)
+    ]
+    page = "<html><body>" + json.dumps({"services": services}) + "</body></html>"
+    return {stop: page for stop in app.bus_stops}
+
+
+# the first recording of each source, decoded the way the poller does
+def recorded_inputs(fixture_dir):
+    from openmeteo_sdk.WeatherApiResponse import WeatherApiResponse
+
+    weather, pages = None, {}
+    for entry in load_manifest(fixture_dir)["responses"]:
+        with open(os.path.join(fixture_dir, entry["file"]), "rb") as f:
+            body = f.read()
+        if entry["source"] == "weather" and weather is None:
+            # length-prefixed FlatBuffer messages, one per location
+            responses, pos = [], 0
+            while pos < len(body):
+                length = int.from_bytes(body[pos:pos + 4], "little")
+                responses.append(WeatherApiResponse.GetRootAs(body, pos + 4))
+                pos += length + 4
+            weather = decode_weather_responses(responses, app.params, list(app.locations))
+        elif entry["source"] == "bus":
+            stop = parse_qs(entry["query"]).get("stops", [None])[0]
+            if stop in app.bus_stops and stop not in pages:
+                pages[stop] = body.decode("utf-8")
+    if weather is None or not pages:
+        raise ValueError(f"{fixture_dir} needs a weather and a bus recording")
+    return weather, pages
+
+
+# callback name -> (function, arguments)
+def cases():
+    return {
+        "update_text_1": (app.update_text_1, (1, app.default_location)),
+        "update_text_2": (app.update_text_2, (1, app.default_location)),
+        "update_text_3": (app.update_text_3, (1,)),
+        "display_page /page-1": (app.display_page, ("/page-1",)),
+        "display_page /page-2": (app.display_page, ("/page-2",)),
+        "display_page /page-3": (app.display_page, ("/page-3",)),
+    }
+
+
+def measure(callback, args, repeat):
+    callback(*args)  # warm up
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        callback(*args)
+        times.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    output = callback(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "median_ms": round(statistics.median(times), 4),
+        "p95_ms": round(statistics.quantiles(times, n=20)[-1], 4),
+        "peak_alloc_kib": round(peak / 1024, 2),
+        "payload_bytes": len(to_json_plotly(output)),
+    }
+
+
+# every metric worse than its baseline by more than the tolerance
+def regressions(results, baseline, tolerance):
+    failures = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(name, {}).get(metric)
+            if previous is None:
+                continue
+            limit = max(previous * (1 + tolerance[metric]), previous + noise[metric])
+            if value > limit:
+                failures.append(f"{name} {metric}: {value:.3f} > {limit:.3f} (baseline {previous:.3f})")
+    return failures
+
+
+def report(results, baseline):
+    print(f"{'callback':<24} {'median ms':>10} {'p95 ms':>10} {'peak KiB':>10} {'payload B':>10}")
+    for name, metrics in results.items():
+        print(f"{name:<24} {metrics['median_ms']:10.3f} {metrics['p95_ms']:10.3f} "
+              f"{metrics['peak_alloc_kib']:10.1f} {metrics['payload_bytes']:10d}")
+        previous = baseline.get(name)
+        if previous:
+            print(f"{'  baseline':<24} {previous['median_ms']:10.3f} {previous['p95_ms']:10.3f} "
+                  f"{previous['peak_alloc_kib']:10.1f} {previous['payload_bytes']:10d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard callbacks against a baseline")
+    parser.add_argument("--fixtures", help="fixture directory recorded by fixture_server.py")
+    parser.add_argument("--repeat", type=int, default=200, help="timed calls per callback")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        mode = "fixtures"
+        weather, pages = recorded_inputs(args.fixtures)
+    else:
+        mode = "synthetic"
+        weather, pages = synthetic_weather(), synthetic_bus_pages(int(time.time()))
+    app.poller.publish("weather", weather)
+    app.poller.publish("bus", app.bus_board(pages))
+
+    results = {name: measure(callback, callback_args, args.repeat)
+               for name, (callback, callback_args) in cases().items()}
+
+    baselines = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baselines = json.load(f)
+    baseline = baselines.get(mode, {})
+    report(results, baseline)
+
+    if args.update_baseline:
+        baselines[mode] = results
+        with open(baseline_path, "w") as f:
+            json.dump(baselines, f, indent=1, sort_keys=True)
+        print(f"Baseline for {mode} inputs written to {baseline_path}")
+    elif not baseline:
+        print(f"No baseline for {mode} inputs yet; run with --update-baseline to store one")
+    else:
+        failures = regressions(results, baseline, default_tolerance)
+        for failure in failures:
+            print("REGRESSION", failure)
+        sys.exit(1 if failures else 0)
@@ -0,0 +1,57 @@
+# Checks the NumPy daily aggregation against pandas' resample('D') and times both.
+# Run from the repository root:  python -m benchmarks.bench_daily_aggregation
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from weather_aggregation import daily_aggregates
+
+
+# the way update_text_2 used to compute daily values
+def pandas_aggregates(start_time, interval, hourly):
+    length = len(next(iter(hourly.values())))
+    index = pd.date_range(start=pd.to_datetime(start_time, unit="s", utc=True),
+                          periods=length, freq=pd.Timedelta(seconds=interval))
+    resampled = pd.DataFrame(hourly, index=index).resample("D")
+    return {"mean": resampled.mean(), "min": resampled.min(), "max": resampled.max(), "sum": resampled.sum()}
+
+
+def make_hourly(n_variables, n_days, start_time, missing=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    hourly = {}
+    for i in range(n_variables):
+        values = rng.uniform(0, 100, n_days * 24).astype(np.float32)
+        values[rng.random(values.size) < missing] = np.nan
+        hourly[f"variable_{i}"] = values
+    # one day with no data at all
+    if n_days > 2:
+        hourly["variable_0"][24:48] = np.nan
+    return hourly
+
+
+def check(start_time, n_variables, n_days):
+    hourly = make_hourly(n_variables, n_days, start_time)
+    expected = pandas_aggregates(start_time, 3600, hourly)
+    actual = daily_aggregates(start_time, 3600, hourly)
+    for reducer, frame in expected.items():
+        for name in hourly:
+            np.testing.assert_allclose(actual[name][reducer], frame[name].to_numpy(dtype=np.float64),
+                                       rtol=1e-5, equal_nan=True, err_msg=f"{name} {reducer}")
+    assert (actual["time"] == frame.index.as_unit("s").asi8).all()
+
+
+if __name__ == "__main__":
+    # midnight-aligned, and starting mid-day as a partial first day
+    for start_time in (1_700_006_400, 1_700_006_400 + 7 * 3600):
+        for n_variables, n_days in [(1, 2), (5, 7), (10, 16)]:
+            check(start_time, n_variables, n_days)
+    print("daily_aggregates matches pandas resample('D') for mean, min, max and sum")
+
+    print(f"{'variables':>9} {'days':>5} {'pandas us':>10} {'numpy us':>9}")
+    start_time = 1_700_006_400
+    for n_variables, n_days in [(1, 2), (5, 7), (10, 16)]:
+        hourly = make_hourly(n_variables, n_days, start_time)
+        pandas_us = min(timeit.repeat(lambda: pandas_aggregates(start_time, 3600, hourly), number=20, repeat=5)) / 20 * 1e6
+        numpy_us = min(timeit.repeat(lambda: daily_aggregates(start_time, 3600, hourly), number=200, repeat=5)) / 200 * 1e6
+        print(f"{n_variables:9d} {n_days:5d} {pandas_us:10.1f} {numpy_us:9.1f}")
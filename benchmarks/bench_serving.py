@@ -0,0 +1,55 @@
+# Development server vs gunicorn (gunicorn.conf.py) under the same kiosk load.
+#
+# Starts each serving mode in turn against fixture_server.py replaying the
+# given recordings, steps both through the same client counts with the load
+# test, and prints the two side by side.
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_serving --fixtures fixtures --clients 1 4 8 16
+import argparse
+
+from benchmarks.load_test import build_payloads, run_step, start_stack, update_intervals, wait_until_up
+
+modes = ["dev", "gunicorn"]
+
+
+def run_mode(server, args):
+    processes = start_stack(args.fixtures, args.port, args.fixture_port,
+                            ["--latency", str(args.upstream_latency)], server)
+    url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(url)
+        pages = build_payloads(url)
+        intervals = update_intervals(args.update_interval)
+        return {clients: run_step(url, pages, clients, args.duration, args.dwell, intervals)
+                for clients in args.clients}
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the development server with gunicorn")
+    parser.add_argument("--fixtures", required=True, help="fixture directory recorded by fixture_server.py")
+    parser.add_argument("--port", type=int, default=8060)
+    parser.add_argument("--fixture-port", type=int, default=8765)
+    parser.add_argument("--upstream-latency", type=float, default=0, help="fixture server latency, ms")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per step")
+    parser.add_argument("--dwell", type=float, default=5, help="seconds each page is shown")
+    parser.add_argument("--update-interval", type=float,
+                        help="seconds between pushed updates of every source (default: each source's TTL)")
+    args = parser.parse_args()
+
+    results = {server: run_mode(server, args) for server in modes}
+
+    print(f"{'clients':>7} " + " ".join(f"{server + ' ' + column:>16}" for server in modes
+                                         for column in ("req/s", "p95 ms", "errors", "refused")))
+    for clients in args.clients:
+        row = []
+        for server in modes:
+            step = results[server][clients]
+            row += [f"{step['throughput']:16.1f}", f"{step['p95_ms']:16.1f}", f"{step['error_rate'] * 100:15.2f}%",
+                    f"{step['streams_refused']:16d}"]
+        print(f"{clients:>7} " + " ".join(row))
@@ -0,0 +1,258 @@
+# Load test for the Dash backend: N simulated kiosks against one server.
+#
+# Each kiosk holds an /events stream open for the whole run, as a screen
+# does, and cycles through the pages. It switches page through display_page,
+# runs the page's server callback as the page mounts, then re-runs it each
+# time its source would push a new snapshot for as long as the page is shown
+# (--dwell). By default that is the poller's real refresh cadence from
+# source_freshness (bus every 60s, weather every 30 minutes); --update-interval
+# overrides it for every source. Requests are real /_dash-update-component
+# POSTs built from the server's own /_dash-dependencies. Throughput, p50/p95/
+# p99 latency and error rate are reported for each client count, along with
+# /events streams that were refused or dropped.
+#
+# With --fixtures the harness starts fixture_server.py on the recordings and
+# the dashboard pointed at it, so runs are repeatable and need no network.
+# --server picks the development server (`python aggregated_live_dash.py`) or
+# gunicorn with gunicorn.conf.py. Otherwise it targets an already running
+# server at --url.
+#
+# Run from the repository root:
+#   python -m benchmarks.load_test --fixtures fixtures --clients 1 2 4 8 16
+#   python -m benchmarks.load_test --fixtures fixtures --server gunicorn
+#   python -m benchmarks.load_test --url http://127.0.0.1:8050 --duration 60
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# page -> {output: (changed input, {input id.property: value})} of the
+# callbacks a screen runs while that page is shown
+page_callbacks = {
+    "/page-1": {"..temp-card.color...temp-ambient.children...temp-real-feel.children...temp-icon.children"
+                "...rain-card.color...rain-fall.children...rain-cloud-cover.children...rain-icon.children..":
+                ("weather-version.data", {"weather-version.data": 1, "location.data": "home"})},
+    "/page-2": {"forecast-table.data":
+                ("weather-version.data", {"weather-version.data": 1, "location.data": "home"})},
+    "/page-3": {"bus-store.data": ("bus-version.data", {"bus-version.data": 1})},
+}
+page_switch_output = "..page-content.children...left-arrow.href...right-arrow.href.."
+
+
+def split_prop(prop_id):
+    component, prop = prop_id.rsplit(".", 1)
+    return {"id": component, "property": prop}
+
+
+# /_dash-update-component request body for a callback, from its dependency entry
+def update_payload(dependency, changed, values):
+    output = dependency["output"]
+    if output.startswith(".."):
+        outputs = [split_prop(prop_id) for prop_id in output[2:-2].split("...")]
+    else:
+        outputs = split_prop(output)
+    inputs = [dict(item, value=values.get(f"{item['id']}.{item['property']}")) for item in dependency["inputs"]]
+    return {"output": output, "outputs": outputs, "inputs": inputs,
+            "changedPropIds": [changed], "state": []}
+
+
+# page -> (switch payload, [(callback payload, source whose pushes re-run it)])
+def build_payloads(url):
+    dependencies = {item["output"]: item for item in requests.get(f"{url}/_dash-dependencies", timeout=10).json()}
+    pages = {}
+    for page, callbacks in page_callbacks.items():
+        switch = update_payload(dependencies[page_switch_output], "url.pathname", {"url.pathname": page})
+        updates = [(update_payload(dependencies[output], changed, values), changed.split("-version.")[0])
+                   for output, (changed, values) in callbacks.items()]
+        pages[page] = (switch, updates)
+    return pages
+
+
+# seconds between pushed snapshots of each source: the poller's refresh
+# cadence unless `override` is given
+def update_intervals(override=None):
+    from aggregated_live_dash import source_freshness
+
+    return {source: override or freshness["ttl"] for source, freshness in source_freshness.items()}
+
+
+# A screen's /events stream, held open until `stop` is set. Appends "refused"
+# (an error response), "dropped" (lost before the end of the run) or "held"
+# to `streams`. Keep-alives arrive every 15s, which is also how long it can
+# take to notice `stop`.
+def hold_events(url, stop, streams):
+    try:
+        with requests.get(f"{url}/events", stream=True, timeout=(5, 60)) as response:
+            if response.status_code != 200:
+                streams.append("refused")
+                return
+            for _ in response.iter_lines():
+                if stop.is_set():
+                    break
+        streams.append("held" if stop.is_set() else "dropped")
+    except requests.RequestException:
+        streams.append("held" if stop.is_set() else "dropped")
+
+
+# one screen: page after page until `stop` is set, recording
+# (finished at, seconds, ok) for every request
+def kiosk(url, pages, dwell, intervals, stop, samples, streams):
+    events = threading.Thread(target=hold_events, args=(url, stop, streams), daemon=True)
+    events.start()
+    session = requests.Session()
+    endpoint = f"{url}/_dash-update-component"
+
+    def post(payload):
+        start = time.perf_counter()
+        try:
+            ok = session.post(endpoint, json=payload, timeout=30).status_code in (200, 204)
+        except requests.RequestException:
+            ok = False
+        samples.append((time.monotonic(), time.perf_counter() - start, ok))
+
+    while not stop.is_set():
+        for switch, updates in pages.values():
+            post(switch)
+            for payload, _ in updates:
+                post(payload)
+            shown_from = time.monotonic()
+            shown_until = shown_from + dwell
+            due = [shown_from + intervals[source] for _, source in updates]
+            # re-run each callback when its source would next push, until the page changes
+            while True:
+                wake = min([shown_until, *due])
+                if stop.wait(max(0.0, wake - time.monotonic())) or wake >= shown_until:
+                    break
+                for i, (payload, source) in enumerate(updates):
+                    if due[i] <= wake:
+                        post(payload)
+                        due[i] += intervals[source]
+            if stop.is_set():
+                break
+    session.close()
+    events.join()
+
+
+def run_step(url, pages, clients, duration, dwell, intervals, warmup=2.0):
+    samples, streams = [], []
+    stop = threading.Event()
+    threads = [threading.Thread(target=kiosk, args=(url, pages, dwell, intervals, stop, samples, streams), daemon=True)
+               for _ in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup + duration)
+    stop.set()
+    # waits for the /events streams too, so the next step starts with none open
+    for thread in threads:
+        thread.join()
+
+    # only requests that finished inside the measured window count
+    window = [(seconds, ok) for finished, seconds, ok in samples
+              if start + warmup <= finished <= start + warmup + duration]
+    latencies = [seconds * 1000 for seconds, _ in window]
+    errors = sum(1 for _, ok in window if not ok)
+    percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [float("nan")] * 99
+    return {
+        "clients": clients,
+        "requests": len(window),
+        "throughput": len(window) / duration,
+        "p50_ms": percentiles[49],
+        "p95_ms": percentiles[94],
+        "p99_ms": percentiles[98],
+        "error_rate": errors / len(window) if window else 0.0,
+        "streams_refused": streams.count("refused"),
+        "streams_dropped": streams.count("dropped"),
+    }
+
+
+def wait_until_up(url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{url}/_dash-dependencies", timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+# command line for each way of serving the dashboard on `port`
+def server_command(server, port):
+    if server == "gunicorn":
+        return [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+                "--bind", f"127.0.0.1:{port}", "wsgi:server"]
+    # what `python aggregated_live_dash.py` runs, without the kiosk browser
+    return [sys.executable, "-c",
+            "import aggregated_live_dash as app; app.poller.start(); "
+            f"app.app.run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)"]
+
+
+# fixture_server.py on the recordings plus the dashboard pointed at it
+def start_stack(fixtures, port, fixture_port, upstream_args, server="dev"):
+    fixture_server = subprocess.Popen(
+        [sys.executable, "fixture_server.py", "--fixtures", fixtures, "serve", "--port", str(fixture_port),
+         *upstream_args],
+        cwd=root,
+    )
+    upstream = f"http://127.0.0.1:{fixture_port}"
+    # a fresh snapshot directory, so gunicorn never picks up another
+    # server's snapshots (or leftovers from an earlier run)
+    env = dict(os.environ,
+               SMART_SCREEN_WEATHER_URL=f"{upstream}/v1/forecast",
+               SMART_SCREEN_BUS_URL=f"{upstream}/departureBoards/website",
+               SMART_SCREEN_SNAPSHOT_DIR=tempfile.mkdtemp(prefix="smart_screen-bench-"))
+    dashboard = subprocess.Popen(server_command(server, port), cwd=root, env=env,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return [dashboard, fixture_server]
+
+
+def report(step):
+    print(f"{step['clients']:>7} {step['requests']:>9} {step['throughput']:>10.1f} "
+          f"{step['p50_ms']:>9.1f} {step['p95_ms']:>9.1f} {step['p99_ms']:>9.1f} {step['error_rate'] * 100:>7.2f}% "
+          f"{step['streams_refused']:>8} {step['streams_dropped']:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate several kiosks against the Dash backend")
+    parser.add_argument("--url", default="http://127.0.0.1:8050", help="dashboard to load (ignored with --fixtures)")
+    parser.add_argument("--fixtures", help="start fixture_server.py on this directory and a dashboard against it")
+    parser.add_argument("--port", type=int, default=8060, help="dashboard port when started with --fixtures")
+    parser.add_argument("--server", choices=["dev", "gunicorn"], default="dev",
+                        help="how to serve the dashboard started with --fixtures")
+    parser.add_argument("--fixture-port", type=int, default=8765)
+    parser.add_argument("--upstream-latency", type=float, default=0, help="fixture server latency, ms")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="client counts to step through")
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per step")
+    parser.add_argument("--dwell", type=float, default=5, help="seconds each page is shown")
+    parser.add_argument("--update-interval", type=float,
+                        help="seconds between pushed updates of every source (default: each source's TTL)")
+    args = parser.parse_args()
+
+    processes = []
+    url = args.url
+    if args.fixtures:
+        processes = start_stack(args.fixtures, args.port, args.fixture_port,
+                                ["--latency", str(args.upstream_latency)], args.server)
+        url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_until_up(url)
+        pages = build_payloads(url)
+        intervals = update_intervals(args.update_interval)
+        print(f"{'clients':>7} {'requests':>9} {'req/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>8} "
+              f"{'refused':>8} {'dropped':>8}")
+        for clients in args.clients:
+            report(run_step(url, pages, clients, args.duration, args.dwell, intervals))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
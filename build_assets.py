@@ -0,0 +1,158 @@
+# Build step for the kiosk's self-hosted asset bundle.
+#
+# Vendors the Bootstrap stylesheet and a Font Awesome subset holding only the
+# glyphs the dashboard's icon tables can return, into assets/vendor/. Dash
+# serves everything under assets/ itself, so once the bundle exists the app
+# stops loading stylesheets and fonts from a CDN.
+#
+#   python build_assets.py                      # download from the CDNs
+#   python build_assets.py --fontawesome-dir DIR --bootstrap-css FILE   # offline
+import argparse
+import hashlib
+import io
+import os
+import re
+
+import dash_bootstrap_components as dbc
+from dash import html
+from fontTools import subset
+from fontTools.ttLib import TTFont
+
+from icons import icons_6x, icons_10x
+
+vendor_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "vendor")
+bootstrap_path = os.path.join(vendor_dir, "bootstrap.min.css")
+fontawesome_css_path = os.path.join(vendor_dir, "fontawesome-subset.css")
+
+# every IconSet the dashboards render from
+icon_sets = [icons_6x, icons_10x]
+
+
+# Font Awesome classes the icon tables can produce, split into glyph names
+# (fa-sun) and modifiers (fa-solid, fa-6x)
+def icon_classes():
+    glyphs, sizes = set(), set()
+    for icon_set in icon_sets:
+        for icon in icon_set.all_icons():
+            if not isinstance(icon, html.I):
+                continue
+            for name in icon.className.split():
+                if re.fullmatch(r"fa-\d+x", name):
+                    sizes.add(name)
+                elif name != "fa-solid":
+                    glyphs.add(name)
+    return sorted(glyphs), sorted(sizes)
+
+
+def read_source(path_or_url):
+    if os.path.exists(path_or_url):
+        with open(path_or_url, "rb") as f:
+            return f.read()
+    import requests
+    response = requests.get(path_or_url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+# Font Awesome 6 writes glyphs either as `.fa-sun::before { content: "\f185" }`
+# or, in later releases, as `.fa-sun { --fa: "\f185" }`
+def glyph_codepoints(fontawesome_css, glyphs):
+    codepoints = {}
+    for glyph in glyphs:
+        match = re.search(
+            r"\." + re.escape(glyph) + r"(?:::?before)?\s*\{[^}]*?(?:content|--fa)\s*:\s*\"\\([0-9a-fA-F]+)",
+            fontawesome_css,
+        )
+        if not match:
+            raise ValueError(f"{glyph} not found in the Font Awesome stylesheet")
+        codepoints[glyph] = int(match.group(1), 16)
+    return codepoints
+
+
+# keep only the glyphs we use; woff2 needs the brotli package, woff does not
+def subset_font(font_bytes, codepoints):
+    try:
+        import brotli  # noqa: F401
+        flavor = "woff2"
+    except ImportError:
+        flavor = "woff"
+
+    options = subset.Options()
+    options.flavor = flavor
+    options.layout_features = []
+    options.name_IDs = []
+    options.notdef_outline = True
+    font = TTFont(io.BytesIO(font_bytes))
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=sorted(set(codepoints.values())))
+    subsetter.subset(font)
+
+    output = io.BytesIO()
+    font.flavor = flavor
+    font.save(output)
+    return output.getvalue(), flavor
+
+
+def fontawesome_stylesheet(font_name, flavor, codepoints, sizes):
+    rules = [
+        "@font-face{font-family:'Font Awesome 6 Free';font-style:normal;font-weight:900;"
+        f"font-display:block;src:url(\"{font_name}\") format(\"{flavor}\")}}",
+        ".fa-solid{-moz-osx-font-smoothing:grayscale;-webkit-font-smoothing:antialiased;display:inline-block;"
+        "font-style:normal;font-variant:normal;line-height:1;text-rendering:auto;"
+        "font-family:'Font Awesome 6 Free';font-weight:900}",
+    ]
+    for size in sizes:
+        rules.append(f".{size}{{font-size:{size[3:-1]}em}}")
+    for glyph, codepoint in sorted(codepoints.items()):
+        rules.append(f'.{glyph}::before{{content:"\\{codepoint:x}"}}')
+    return "\n".join(rules) + "\n"
+
+
+# write through a temporary file, so a failed build never leaves half a file
+def write_file(path, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def build(bootstrap_css, fontawesome_css, fontawesome_font):
+    # Fetch and subset everything before touching assets/vendor, so a failure
+    # leaves the previous build (or none) in place. Bootstrap goes last: the
+    # app only serves the vendored files once both stylesheets exist.
+    bootstrap = read_source(bootstrap_css)
+    glyphs, sizes = icon_classes()
+    codepoints = glyph_codepoints(read_source(fontawesome_css).decode("utf-8"), glyphs)
+    font_bytes, flavor = subset_font(read_source(fontawesome_font), codepoints)
+
+    # content-hashed name, so the font can be cached for as long as the CSS is
+    font_name = f"fa-solid-900-{hashlib.sha1(font_bytes).hexdigest()[:10]}.{flavor}"
+    stylesheet = fontawesome_stylesheet(font_name, flavor, codepoints, sizes)
+
+    os.makedirs(vendor_dir, exist_ok=True)
+    write_file(os.path.join(vendor_dir, font_name), font_bytes)
+    write_file(fontawesome_css_path, stylesheet.encode("utf-8"))
+    write_file(bootstrap_path, bootstrap)
+    for old in os.listdir(vendor_dir):
+        if old.startswith("fa-solid-900-") and old != font_name:
+            os.remove(os.path.join(vendor_dir, old))
+
+    print(f"Bootstrap: {len(bootstrap)} bytes")
+    print(f"Font Awesome subset: {len(codepoints)} glyphs, {len(font_bytes)} bytes ({flavor})")
+
+
+if __name__ == "__main__":
+    fontawesome_release = dbc.icons.FONT_AWESOME.rsplit("/css/", 1)[0]
+
+    parser = argparse.ArgumentParser(description="Vendor Bootstrap and a Font Awesome subset into assets/vendor")
+    parser.add_argument("--bootstrap-css", default=dbc.themes.BOOTSTRAP,
+                        help="Bootstrap stylesheet, as a URL or local file")
+    parser.add_argument("--fontawesome-dir", default=fontawesome_release,
+                        help="Font Awesome 6 release holding css/all.css and webfonts/, as a URL or local directory")
+    args = parser.parse_args()
+
+    build(
+        args.bootstrap_css,
+        f"{args.fontawesome_dir}/css/all.css",
+        f"{args.fontawesome_dir}/webfonts/fa-solid-900.ttf",
+    )
@@ -0,0 +1,128 @@
+import heapq
+import json
+import time
+from itertools import islice
+from operator import attrgetter
+
+
+# Raised when the departure board response holds no usable departure JSON
+class DepartureParseError(ValueError):
+    pass
+
+
+# refuse to scan responses bigger than this; the real board is a few KB
+max_page_length = 2_000_000
+
+_decoder = json.JSONDecoder()
+
+
+# Find and decode the departure JSON in a single left-to-right pass.
+# Each '{' is handed to the JSON decoder, which stops at the end of the
+# object it decodes, so nothing is backtracked and only the payload itself
+# is parsed. Brace blocks that are not JSON (CSS, scripts) are skipped, JSON
+# objects without `key` are jumped over, and a payload that starts as JSON
+# but is cut off or malformed fails straight away.
+def extract_departure_json(text, key="services"):
+    if len(text) > max_page_length:
+        raise DepartureParseError(f"Departure page is {len(text)} characters, over the {max_page_length} limit")
+
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, end = _decoder.raw_decode(text, start)
+        except json.JSONDecodeError as e:
+            # a brace followed by a quoted key is JSON that went wrong, not markup
+            if text[start + 1:start + 64].lstrip().startswith('"'):
+                raise DepartureParseError(f"Malformed departure JSON at character {e.pos}: {e.msg}") from e
+            start = text.find("{", start + 1)
+            continue
+
+        if isinstance(data, dict) and key in data:
+            return data
+        start = text.find("{", end)
+
+    raise DepartureParseError(f"No departure JSON with a '{key}' field found")
+
+
+# One row on the departure board. Slotted so a board of a dozen rows is a
+# handful of small objects rather than dicts or a DataFrame.
+# `departure_unix` is the absolute departure time, which lets the browser
+# count down locally instead of asking the server for a new `minutes`.
+# `journey_id`, when the board provides one, identifies the vehicle's trip.
+class Departure:
+    __slots__ = ("service", "minutes", "departure_time", "departure_unix", "stop", "journey_id")
+
+    def __init__(self, service, minutes, departure_time, departure_unix, stop="", journey_id=None):
+        self.service = service
+        self.minutes = minutes
+        self.departure_time = departure_time
+        self.departure_unix = departure_unix
+        self.stop = stop
+        self.journey_id = journey_id
+
+    def __repr__(self):
+        return (f"Departure({self.service!r}, {self.minutes!r}, {self.departure_time!r}, "
+                f"{self.departure_unix!r}, {self.stop!r}, {self.journey_id!r})")
+
+    # DataTable row, keyed by the column ids in board_columns.
+    # The extra departure_unix field is not displayed.
+    def as_row(self):
+        return {
+            "Stop": self.stop,
+            "Bus": self.service,
+            "Mins to Departure": self.minutes,
+            "Departure Time": self.departure_time,
+            "departure_unix": self.departure_unix,
+        }
+
+
+# DataTable columns, with a stop column when the board covers several stops
+def board_columns(include_stop=False):
+    names = ("Stop", "Bus", "Mins to Departure", "Departure Time") if include_stop else ("Bus", "Mins to Departure", "Departure Time")
+    return [{"name": i, "id": i} for i in names]
+
+
+# Use the board's own unix timestamp when it has one, otherwise anchor
+# `minutes` to the time the board was fetched
+def _service_departures(service, per_service, fetched_at, stop):
+    service_name = service["service_name"]
+    for departure in service["departures"][:per_service]:
+        minutes = departure["minutes"]
+        departure_unix = departure.get("departure_time_unix") or int(fetched_at + minutes * 60)
+        yield Departure(service_name, minutes, departure["departure_time"], departure_unix,
+                        stop, departure.get("journey_id"))
+
+
+# Each service's departures already arrive soonest first, so a k-way merge
+# of the per-service lists yields the whole board in order without sorting.
+# `per_service` caps departures taken from each service, `limit` the board.
+def soonest_departures(data, per_service=3, limit=None, fetched_at=None, stop=""):
+    if fetched_at is None:
+        fetched_at = time.time()
+    streams = [_service_departures(service, per_service, fetched_at, stop) for service in data["services"]]
+    merged = heapq.merge(*streams, key=attrgetter("minutes"))
+    return list(islice(merged, limit))
+
+
+# A journey seen at two stops is the same bus; without a journey id only an
+# exact repeat (same stop, service and time) counts as a duplicate
+def _departure_key(departure):
+    if departure.journey_id is not None:
+        return (departure.service, departure.journey_id)
+    return (departure.stop, departure.service, departure.departure_unix)
+
+
+# Merge several stops' boards (each already in order) into one time-ordered
+# board, keeping only the soonest sighting of a duplicated departure
+def merge_boards(boards, limit=None):
+    seen = set()
+    merged = []
+    for departure in heapq.merge(*boards, key=attrgetter("departure_unix")):
+        key = _departure_key(departure)
+        if key in seen:
+            continue
+        seen.add(key)
+        merged.append(departure)
+        if limit is not None and len(merged) == limit:
+            break
+    return merged
@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# requests session with a keep-alive connection pool of `pool_size`
+def pooled_session(pool_size=4):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Keep-alive client for the Lothian departure board.
+# One pooled session is reused across polls so the TLS handshake is paid once,
+# and ETag / Last-Modified validators are sent back so an unchanged board
+# costs a 304 instead of a full download.
+class BusClient:
+    def __init__(self, url, timeout=10, pool_size=4, session=None):
+        self.url = url
+        self.timeout = timeout
+        self.session = session or pooled_session(pool_size)
+
+        # validators and body from the last full (200) response, and the unix
+        # time it arrived. A 304 hands back that body, so anything relative
+        # in it (minutes to departure) counts from fetched_at.
+        self.fetched_at = None
+        self._etag = None
+        self._last_modified = None
+        self._body = None
+        self._body_bytes = 0
+        self._full_elapsed = 0.0
+
+        # per-poll and running totals of what the validators saved; the
+        # totals are exported on /metrics
+        self.last_poll = {}
+        self.totals = {"polls": 0, "not_modified": 0, "bytes_saved": 0, "seconds_saved": 0.0}
+
+    def fetch(self):
+        headers = {}
+        if self._body is not None:
+            if self._etag:
+                headers["If-None-Match"] = self._etag
+            if self._last_modified:
+                headers["If-Modified-Since"] = self._last_modified
+
+        start = time.perf_counter()
+        response = self.session.get(self.url, headers=headers, timeout=self.timeout)
+        elapsed = time.perf_counter() - start
+
+        if response.status_code == 304 and self._body is not None:
+            not_modified = True
+            bytes_saved = self._body_bytes
+            seconds_saved = max(0.0, self._full_elapsed - elapsed)
+        else:
+            response.raise_for_status()
+            not_modified = False
+            bytes_saved = 0
+            seconds_saved = 0.0
+            self._etag = response.headers.get("ETag")
+            self._last_modified = response.headers.get("Last-Modified")
+            self._body = response.text
+            self.fetched_at = time.time()
+            self._body_bytes = len(response.content)
+            self._full_elapsed = elapsed
+
+        self.last_poll = {
+            "status": response.status_code,
+            "not_modified": not_modified,
+            "elapsed": elapsed,
+            "bytes_saved": bytes_saved,
+            "seconds_saved": seconds_saved,
+        }
+        self.totals["polls"] += 1
+        self.totals["not_modified"] += int(not_modified)
+        self.totals["bytes_saved"] += bytes_saved
+        self.totals["seconds_saved"] += seconds_saved
+
+        return self._body
+
+    def close(self):
+        self.session.close()
+
+
+# Boards for several stops, fetched concurrently over one shared session.
+# At most `max_workers` requests are in flight, so adding stops costs about
+# one round trip rather than one per stop.
+class MultiStopBusClient:
+    def __init__(self, base_url, stops, timeout=10, max_workers=4):
+        self.session = pooled_session(max_workers)
+        self.clients = {stop: BusClient(f"{base_url}?stops={stop}", timeout=timeout, session=self.session)
+                        for stop in stops}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bus-fetch")
+
+    # {stop: page text} for every stop that answered. A stop that fails is
+    # left out; only when every stop fails is the first error raised.
+    def fetch_all(self):
+        futures = {stop: self._executor.submit(client.fetch) for stop, client in self.clients.items()}
+        pages, errors = {}, []
+        for stop, future in futures.items():
+            try:
+                pages[stop] = future.result()
+            except Exception as e:
+                print(f"Failed to fetch bus stop {stop}:", e)
+                errors.append(e)
+        if errors and not pages:
+            raise errors[0]
+        return pages
+
+    # {stop: unix time of its last full response} for the stops in `pages`
+    def fetched_at(self, pages):
+        return {stop: self.clients[stop].fetched_at for stop in pages}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
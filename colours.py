@@ -0,0 +1,81 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+# The named colours the dashboards use, so nothing needs matplotlib just to
+# parse a colour name. Any "#rrggbb" or "#rgb" string works as well.
+named_colours = {
+    "black": "#000000",
+    "white": "#ffffff",
+    "red": "#ff0000",
+    "green": "#008000",
+    "blue": "#0000ff",
+    "yellow": "#ffff00",
+    "orange": "#ffa500",
+    "grey": "#808080",
+    "gray": "#808080",
+    "dimgrey": "#696969",
+    "dimgray": "#696969",
+    "lightgrey": "#d3d3d3",
+    "lightgray": "#d3d3d3",
+    "lightblue": "#add8e6",
+    "skyblue": "#87ceeb",
+    "navy": "#000080",
+}
+
+
+# colour name or hex string -> array of red, green, blue in the 0-1 range
+def to_rgb(colour):
+    hex_colour = named_colours.get(colour.lower(), colour)
+    if not hex_colour.startswith("#") or len(hex_colour) not in (4, 7):
+        raise ValueError(f"Unknown colour: {colour!r}")
+    digits = hex_colour[1:]
+    if len(digits) == 3:
+        digits = "".join(digit * 2 for digit in digits)
+    return np.array([int(digits[i:i + 2], 16) for i in (0, 2, 4)]) / 255
+
+
+# A linear gradient between two colours over a value range, precomputed as a
+# lookup table of hex strings. Values are clamped to the range and quantised
+# to `steps` levels, so colouring a value is an index into a list.
+class ColourGradient:
+    def __init__(self, low_gradient, high_gradient, min_value, max_value, steps=256):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.steps = steps
+
+        weights = np.linspace(0, 1, steps)[:, np.newaxis]
+        rgb = to_rgb(low_gradient) * (1 - weights) + to_rgb(high_gradient) * weights
+        channels = np.round(rgb * 255).astype(int)
+        self.lut = ["#%02x%02x%02x" % tuple(row) for row in channels]
+
+    # value(s) -> lookup table index(es)
+    def _index(self, values):
+        normalized = (np.asarray(values, dtype=float) - self.min_value) / (self.max_value - self.min_value)
+        return np.rint(np.clip(normalized, 0, 1) * (self.steps - 1)).astype(int)
+
+    # single values stay in plain Python; NumPy only pays off for a series
+    def __call__(self, value):
+        normalized = (value - self.min_value) / (self.max_value - self.min_value)
+        return self.lut[round(min(max(normalized, 0), 1) * (self.steps - 1))]
+
+    # colour a whole series (e.g. hourly forecast cells) in one call
+    def colour_series(self, values):
+        lut = self.lut
+        return [lut[i] for i in self._index(values).tolist()]
+
+
+# gradients are built once per (low, high, min, max) and reused
+@lru_cache(maxsize=None)
+def gradient(low_gradient, high_gradient, min_value, max_value):
+    return ColourGradient(low_gradient, high_gradient, min_value, max_value)
+
+
+# use weather variables to choose background colours of cards
+def interpolate_colour(value,
+                       min_value=0,
+                       max_value=100,
+                       low_gradient = 'lightblue',
+                       high_gradient = 'red'):
+    return gradient(low_gradient, high_gradient, min_value, max_value)(value)
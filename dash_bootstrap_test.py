@@ -1,5 +1,5 @@
 import random
-import matplotlib.colors as mcolors
+from colours import interpolate_colour
 
 import dash
 import dash_bootstrap_components as dbc
@@ -45,26 +45,6 @@ def map_rain_to_icon(value):
     else:
         return html.P("Get inside!", style={"fontSize": "40px"})
 
-# use weather variables to choose background colours of cards
-def interpolate_colour(value,
-                       min_value=0,
-                       max_value=100,
-                       low_gradient = 'lightblue',
-                       high_gradient = 'red'):
-
-    # Normalize the value to be between 0 and 1
-    normalized_value = (value - min_value) / (max_value - min_value)
-
-    # Create color gradients from low to high
-    colour1 = mcolors.to_rgba(low_gradient)
-    colour2 = mcolors.to_rgba(high_gradient)
-
-    interpolated_colour = mcolors.to_hex(
-        [
-        colour1[i] * (1 - normalized_value) + colour2[i] * normalized_value for i in range(4)
-        ]
-    )
-    return interpolated_colour
 
 # Create a Dash application instance
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP, dbc.icons.FONT_AWESOME])
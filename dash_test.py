@@ -1,7 +1,7 @@
 import dash
 from dash import html, dcc, callback, Input, Output
 import random
-import matplotlib.colors as mcolors
+from colours import gradient
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
@@ -13,17 +13,9 @@ def randint(min=0, max=30):
 # Example numbers to display
 numbers = [randint(), randint()]
 
-# Function to interpolate between blue and red based on a value from 0 to 100
+# Function to interpolate between blue and red based on a value from 0 to 30
 def interpolate_colour(value, min_value=0, max_value=30):
-    # Normalize the value to be between 0 and 1
-    normalized_value = (value - min_value) / (max_value - min_value)
-    # Create color gradients from blue to red
-    colour1 = mcolors.to_rgba('lightblue')
-    colour2 = mcolors.to_rgba('red')
-    # Interpolate color
-    interpolated_colour = mcolors.to_hex([
-        colour1[i] * (1 - normalized_value) + colour2[i] * normalized_value for i in range(4)])
-    return interpolated_colour
+    return gradient('lightblue', 'red', min_value, max_value)(value)
 
 # Example text to display on the second page
 random_text = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. Vivamus lacinia odio vitae vestibulum vestibulum. Cras venenatis euismod malesuada."
@@ -0,0 +1,226 @@
+import threading
+import time
+
+# Returned by a fetch function when upstream has nothing new (e.g. every
+# request was answered 304). The current value is kept and counted as fresh
+# again, but its version isn't bumped, so nobody is told about it.
+unchanged = object()
+
+
+# A single background poller that owns the upstream fetch schedules.
+# Each source runs on its own daemon thread and publishes its latest value
+# into an in-memory snapshot, so Dash callbacks only ever read from memory.
+#
+# Reads follow stale-while-revalidate: once a value is older than its source's
+# `ttl` it is still served straight away while a background refresh is
+# triggered, and only after `max_staleness` is it withheld altogether.
+#
+# With a SharedSnapshotStore (see share()) several worker processes use one
+# set of fetches: whichever process holds the store's lock runs the sources
+# and writes every value to the store, and the others follow the store
+# instead of fetching. Versions come from the store, so all workers agree.
+class DataPoller:
+    def __init__(self, follow_interval=0.5):
+        self.follow_interval = follow_interval
+        self._store = None
+        self._sources = {}
+        self._snapshot = {}
+        self._ready = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._stop = threading.Event()
+        self._threads = []
+
+    # register a fetch function, refreshed every `ttl` seconds. A failed fetch
+    # is retried after `retry_interval` (or `ttl`, if that is sooner).
+    # `max_staleness` of None serves the last good value forever.
+    def add_source(self, name, fetch, ttl, max_staleness=None, retry_interval=60):
+        self._sources[name] = {
+            "fetch": fetch,
+            "ttl": ttl,
+            "max_staleness": max_staleness,
+            "retry_interval": retry_interval,
+            "wake": threading.Event(),
+            "fetching": False,
+            "last_attempt": 0.0,
+        }
+        self._ready[name] = threading.Event()
+        self._versions[name] = 0
+
+    # share values with other processes through `store`; call before start()
+    def share(self, store):
+        self._store = store
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            if self._store is None:
+                self._start_sources()
+            else:
+                thread = threading.Thread(target=self._follow, name="poller-follow", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _start_sources(self):
+        for name in self._sources:
+            thread = threading.Thread(target=self._run, args=(name,), name=f"poller-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    # Read the store until this process wins the fetcher lock (at once, if
+    # nobody holds it), then start fetching. A fetcher that exits frees the
+    # lock for the next follower to pick up. Whatever is already in the store
+    # is read first, so a new fetcher starts from the last shared values and
+    # keeps to their schedule.
+    def _follow(self):
+        while not self._stop.is_set():
+            self._read_store()
+            if self._store.try_lead():
+                with self._lock:
+                    self._start_sources()
+                return
+            self._stop.wait(self.follow_interval)
+
+    def _read_store(self):
+        for name in self._sources:
+            try:
+                version, value, published_at = self._store.read(name)
+            except Exception as e:
+                print(f"Failed to read shared {name}:", e)
+                continue
+            if not version:
+                continue
+            if version != self._versions[name]:
+                with self._changed:
+                    self._snapshot[name] = (value, published_at)
+                    self._versions[name] = version
+                    self._changed.notify_all()
+                self._ready[name].set()
+            elif published_at != self._snapshot[name][1]:
+                # the fetcher found nothing new; only the value's age changes
+                with self._lock:
+                    self._snapshot[name] = (self._snapshot[name][0], published_at)
+
+    def stop(self):
+        self._stop.set()
+        for source in self._sources.values():
+            source["wake"].set()
+
+    # fetch once now, outside the schedule (used at startup and by scripts).
+    # Returns what the fetch returned, which may be `unchanged`.
+    def refresh(self, name):
+        value = self._sources[name]["fetch"]()
+        self._publish(name, value)
+        return value
+
+    # publish a value without fetching it (benchmarks, recorded fixtures)
+    def publish(self, name, value):
+        self._publish(name, value)
+
+    def _run(self, name):
+        source = self._sources[name]
+        entry = self._snapshot.get(name)
+        if entry is not None:
+            # taking over from another process: carry on from its last publish
+            # rather than fetching everything again straight away
+            source["wake"].wait(max(0, source["ttl"] - (time.time() - entry[1])))
+            source["wake"].clear()
+        while not self._stop.is_set():
+            source["fetching"] = True
+            try:
+                self.refresh(name)
+                wait = source["ttl"]
+            except Exception as e:
+                # keep serving the last good value if an upstream fetch fails
+                print(f"Failed to refresh {name}:", e)
+                wait = min(source["ttl"], source["retry_interval"])
+            source["fetching"] = False
+            source["last_attempt"] = time.time()
+            # the cold start is over after the first attempt, good or bad
+            self._ready[name].set()
+            # sleeps until the next refresh is due, or a reader finds the value stale
+            source["wake"].wait(wait)
+            source["wake"].clear()
+
+    def _publish(self, name, value):
+        published_at = time.time()
+        if value is unchanged:
+            self._touch(name, published_at)
+            return
+        version = None
+        if self._store is not None and self._store.leader:
+            version = self._store.write(name, value, published_at)
+        with self._changed:
+            self._snapshot[name] = (value, published_at)
+            self._versions[name] = version or self._versions[name] + 1
+            self._changed.notify_all()
+        self._ready[name].set()
+
+    # keep the current value, published again as of `published_at`
+    def _touch(self, name, published_at):
+        with self._lock:
+            entry = self._snapshot.get(name)
+            if entry is None:
+                return
+            self._snapshot[name] = (entry[0], published_at)
+        if self._store is not None and self._store.leader:
+            self._store.touch(name, published_at)
+
+    # seconds since the source was last published, or None
+    def age(self, name):
+        entry = self._snapshot.get(name)
+        return time.time() - entry[1] if entry else None
+
+    # latest published value for a source, or None once it is older than the
+    # source's max_staleness. Only blocks on a cold start, when a timeout is
+    # given and the source's first fetch hasn't finished. That wait happens
+    # once per process: after the first fetch fails or the timeout passes,
+    # callers get None straight away until something is published.
+    def latest(self, name, timeout=None):
+        entry = self._snapshot.get(name)
+        if entry is None and timeout and not self._ready[name].is_set():
+            if not self._ready[name].wait(timeout):
+                self._ready[name].set()
+            entry = self._snapshot.get(name)
+        if entry is None:
+            return None
+
+        value, published_at = entry
+        age = time.time() - published_at
+        source = self._sources[name]
+        if (age > source["ttl"] and not source["fetching"]
+                and time.time() - source["last_attempt"] >= source["retry_interval"]):
+            # serve the stale value now and revalidate in the background, but
+            # no sooner than retry_interval after the last attempt, so reads
+            # don't hammer an upstream that is failing
+            source["wake"].set()
+        if source["max_staleness"] is not None and age > source["max_staleness"]:
+            return None
+        return value
+
+    # whether latest() is withholding the source's value for being older than
+    # its max_staleness
+    def stale(self, name):
+        age = self.age(name)
+        max_staleness = self._sources[name]["max_staleness"]
+        return age is not None and max_staleness is not None and age > max_staleness
+
+    # unix time the source was last published, or None
+    def published_at(self, name):
+        entry = self._snapshot.get(name)
+        return entry[1] if entry else None
+
+    # per-source publish counters, bumped every time a new value is published
+    # (not when a fetch comes back unchanged)
+    def versions(self):
+        with self._lock:
+            return dict(self._versions)
+
+    # block until any source publishes something newer than `versions`,
+    # or until the timeout passes. Returns the current versions either way.
+    def wait_for_update(self, versions, timeout=None):
+        with self._changed:
+            self._changed.wait_for(lambda: self._versions != versions, timeout)
+            return dict(self._versions)
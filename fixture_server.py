@@ -0,0 +1,201 @@
+# Record-and-replay fixtures for the upstream APIs.
+#
+# `record` captures the raw Open-Meteo FlatBuffer payload and the Lothian
+# departure page for every stop, exactly as the dashboard requests them, into
+# a fixture directory. `serve` plays them back from a local HTTP server with
+# optional latency, jitter and injected failures, so the callbacks can be
+# benchmarked and exercised on an offline box with deterministic inputs.
+#
+#   python fixture_server.py record --count 5 --interval 60
+#   python fixture_server.py serve --latency 80 --jitter 40 --failure-rate 0.05 --seed 1
+#
+#   SMART_SCREEN_WEATHER_URL=http://127.0.0.1:8765/v1/forecast \
+#   SMART_SCREEN_BUS_URL=http://127.0.0.1:8765/departureBoards/website \
+#   python aggregated_live_dash.py
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+default_fixture_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+manifest_name = "manifest.json"
+
+
+# the requests the dashboard makes: (source, url, query params)
+def dashboard_requests():
+    import aggregated_live_dash as app
+
+    weather_params = dict(app.params, format="flatbuffers")
+    yield "weather", app.weather_url, weather_params
+    for stop in app.bus_stops:
+        yield "bus", app.bus_url, {"stops": stop}
+
+
+def load_manifest(fixture_dir):
+    path = os.path.join(fixture_dir, manifest_name)
+    if not os.path.exists(path):
+        return {"responses": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+# Append `count` rounds of live responses, `interval` seconds apart. Every
+# response is stored as raw bytes with its path, query and content type.
+def record(fixture_dir, count=1, interval=60):
+    import requests
+
+    os.makedirs(fixture_dir, exist_ok=True)
+    manifest = load_manifest(fixture_dir)
+    session = requests.Session()
+
+    for round_number in range(count):
+        if round_number:
+            time.sleep(interval)
+        for source, url, query in dashboard_requests():
+            response = session.get(url, params=query, timeout=30)
+            response.raise_for_status()
+
+            # the query string exactly as sent, so replay can match on it
+            request_url = urlsplit(response.request.url)
+            name = f"{source}-{len(manifest['responses']):04d}.bin"
+            with open(os.path.join(fixture_dir, name), "wb") as f:
+                f.write(response.content)
+            manifest["responses"].append({
+                "source": source,
+                "path": request_url.path,
+                "query": request_url.query,
+                "file": name,
+                "content_type": response.headers.get("Content-Type", "application/octet-stream"),
+                "recorded_at": time.time(),
+            })
+            print(f"{source}: {len(response.content)} bytes -> {name}")
+
+    with open(os.path.join(fixture_dir, manifest_name), "w") as f:
+        json.dump(manifest, f, indent=1)
+
+
+# Serves recorded responses back. Requests are matched on path and query;
+# a query that was never recorded falls back to every recording for that
+# path. Successive requests cycle through the matching recordings in the
+# order they were captured, unless `freeze` keeps serving the first one.
+class FixtureReplay:
+    def __init__(self, fixture_dir, latency=0.0, jitter=0.0, failure_rate=0.0,
+                 failure_status=503, freeze=False, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.freeze = freeze
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next = {}
+
+        self.by_path = {}
+        self.by_query = {}
+        for entry in load_manifest(fixture_dir)["responses"]:
+            with open(os.path.join(fixture_dir, entry["file"]), "rb") as f:
+                body = f.read()
+            fixture = {
+                "body": body,
+                "content_type": entry["content_type"],
+                "etag": '"' + hashlib.sha1(body).hexdigest()[:16] + '"',
+            }
+            self.by_path.setdefault(entry["path"], []).append(fixture)
+            self.by_query.setdefault((entry["path"], entry["query"]), []).append(fixture)
+        if not self.by_path:
+            raise ValueError(f"No recorded responses in {fixture_dir}")
+
+    # (status, fixture or None, delay in seconds) for one request
+    def respond(self, path, query):
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            if self._random.random() < self.failure_rate:
+                return self.failure_status, None, delay
+
+            key = (path, query)
+            fixtures = self.by_query.get(key) or self.by_path.get(path)
+            if not fixtures:
+                return 404, None, delay
+            index = 0 if self.freeze else self._next.get(key, 0)
+            self._next[key] = index + 1
+            return 200, fixtures[index % len(fixtures)], delay
+
+
+def make_handler(replay):
+    class FixtureHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, fixture, delay = replay.respond(url.path, url.query)
+            time.sleep(delay)
+
+            if fixture is None:
+                body = json.dumps({"error": True, "reason": f"fixture server returned {status}"}).encode()
+                self._send(status, body, "application/json")
+            elif self.headers.get("If-None-Match") == fixture["etag"]:
+                self._send(304, b"", None, fixture["etag"])
+            else:
+                self._send(200, fixture["body"], fixture["content_type"], fixture["etag"])
+
+        def _send(self, status, body, content_type, etag=None):
+            self.send_response(status)
+            if content_type:
+                self.send_header("Content-Type", content_type)
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FixtureHandler
+
+
+def serve(replay, host="127.0.0.1", port=8765):
+    server = ThreadingHTTPServer((host, port), make_handler(replay))
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record and replay upstream API responses")
+    parser.add_argument("--fixtures", default=default_fixture_dir, help="fixture directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="capture live responses")
+    record_parser.add_argument("--count", type=int, default=1, help="rounds of responses to capture")
+    record_parser.add_argument("--interval", type=float, default=60, help="seconds between rounds")
+
+    serve_parser = commands.add_parser("serve", help="replay captured responses")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--latency", type=float, default=0, help="added latency per request, ms")
+    serve_parser.add_argument("--jitter", type=float, default=0, help="uniform +/- jitter on the latency, ms")
+    serve_parser.add_argument("--failure-rate", type=float, default=0, help="fraction of requests that fail")
+    serve_parser.add_argument("--failure-status", type=int, default=503, help="status code of a failed request")
+    serve_parser.add_argument("--freeze", action="store_true", help="always serve the first recording")
+    serve_parser.add_argument("--seed", type=int, default=None, help="seed for jitter and failures")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.fixtures, args.count, args.interval)
+    else:
+        replay = FixtureReplay(args.fixtures, args.latency / 1000, args.jitter / 1000,
+                               args.failure_rate, args.failure_status, args.freeze, args.seed)
+        server = serve(replay, args.host, args.port)
+        print(f"Replaying {sum(map(len, replay.by_path.values()))} responses on http://{args.host}:{args.port}")
+        for path in replay.by_path:
+            print(f"  http://{args.host}:{args.port}{path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
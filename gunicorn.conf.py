@@ -0,0 +1,60 @@
+# gunicorn settings for serving the dashboard to several screens.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:server
+#
+# Every setting can be overridden from the environment, e.g.
+# SMART_SCREEN_WORKERS=3 SMART_SCREEN_SCREENS=12 gunicorn -c gunicorn.conf.py wsgi:server
+import os
+
+bind = os.environ.get("SMART_SCREEN_BIND", "0.0.0.0:8050")
+
+# Import the app once in the master and fork the workers from it, so the
+# imported modules and prebuilt layouts are shared copy-on-write
+preload_app = True
+
+# Callbacks only read the in-memory snapshot, so a worker spends most of its
+# time on JSON and is cheap in threads. Two workers leave a Pi's other cores
+# to the kiosk browser.
+#
+# Each open screen holds a thread on its /events stream for as long as it is
+# connected, and nothing stops every stream landing on the same worker. So
+# each worker gets a thread per expected screen (SMART_SCREEN_SCREENS) plus
+# spare threads for callbacks, and refuses streams beyond its screen threads
+# with a 503 (the page retries a few seconds later). However many streams
+# are open or half-closed, the spare threads stay free for callbacks.
+workers = int(os.environ.get("SMART_SCREEN_WORKERS", 2))
+worker_class = "gthread"
+screens = int(os.environ.get("SMART_SCREEN_SCREENS", 8))
+spare_threads = int(os.environ.get("SMART_SCREEN_SPARE_THREADS", 4))
+threads = int(os.environ.get("SMART_SCREEN_THREADS", screens + spare_threads))
+# read by aggregated_live_dash when the app is preloaded
+os.environ.setdefault("SMART_SCREEN_MAX_EVENT_STREAMS", str(max(1, threads - spare_threads)))
+
+# /events streams stay open; a keep-alive comment is sent every 15s
+timeout = 60
+graceful_timeout = 10
+keepalive = 5
+
+# Recycle workers now and then so a slow leak can't build up over months
+max_requests = 20000
+max_requests_jitter = 2000
+
+accesslog = None
+errorlog = "-"
+
+
+# Threads don't survive fork, so each worker starts its poller here. The
+# workers share snapshots, so only one of them fetches upstream at a time.
+# Snapshots are kept per bind address, so another server on the same host
+# (a benchmark, say) doesn't join this one's.
+def post_fork(server, worker):
+    from aggregated_live_dash import poller, share_snapshots
+
+    share_snapshots(",".join(server.cfg.bind))
+    poller.start()
+
+
+def worker_exit(server, worker):
+    from aggregated_live_dash import poller
+
+    poller.stop()
@@ -0,0 +1,327 @@
+import atexit
+import threading
+import time
+from datetime import datetime
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from requests_cache.backends.sqlite import SQLiteCache
+
+# held in the LRU for keys known not to be on disk, so repeated lookups of a
+# missing key (most redirect lookups) don't each cost a disk read
+_missing = object()
+
+
+# Two-tier store: a bounded in-process LRU in front of a slower backing
+# mapping (one of requests_cache's SQLite tables on the Pi's SD card).
+#
+# Reads are served from memory when possible and only fall through to disk on
+# a miss. Writes and deletes stay in memory and reach the backing store in one
+# batched transaction at most every `flush_interval` seconds, on close(), or
+# when flush() is called. Misses are remembered too. Entries evicted from the
+# LRU before they are flushed are still held (and readable) until the next
+# flush.
+class TieredDict(MutableMapping):
+    def __init__(self, backing, max_entries=64, flush_interval=3600):
+        self.backing = backing
+        self.max_entries = max_entries
+        self.flush_interval = flush_interval
+
+        self._memory = OrderedDict()
+        self._dirty = {}
+        self._deleted = set()
+        self._last_used = {}
+        self._lock = threading.RLock()
+        self._last_flush = time.monotonic()
+
+        self.counters = {
+            "memory_hits": 0,
+            "memory_misses": 0,
+            "disk_hits": 0,
+            "disk_misses": 0,
+            "disk_reads": 0,
+            "disk_writes": 0,
+            "flushes": 0,
+        }
+
+    # backend-specific helpers (serializer, connection, vacuum...) come
+    # straight from the backing store. Anything that queries or changes the
+    # table in SQL has to flush first and invalidate() after changing it;
+    # count() and sorted() below do, and so does TieredSQLiteCache.
+    def __getattr__(self, name):
+        if name == "backing":
+            raise AttributeError(name)
+        return getattr(self.backing, name)
+
+    def _remember(self, key, value):
+        if value is not _missing:
+            self._last_used[key] = time.time()
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def __getitem__(self, key):
+        with self._lock:
+            if key in self._memory:
+                self.counters["memory_hits"] += 1
+                self._memory.move_to_end(key)
+                value = self._memory[key]
+                if value is _missing:
+                    raise KeyError(key)
+                self._last_used[key] = time.time()
+                return value
+            self.counters["memory_misses"] += 1
+
+            if key in self._dirty:
+                value = self._dirty[key]
+                self._remember(key, value)
+                return value
+            if key in self._deleted:
+                self._remember(key, _missing)
+                raise KeyError(key)
+
+            self.counters["disk_reads"] += 1
+            try:
+                value = self.backing[key]
+            except KeyError:
+                self.counters["disk_misses"] += 1
+                self._remember(key, _missing)
+                raise
+            self.counters["disk_hits"] += 1
+            self._remember(key, value)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+            self._dirty[key] = value
+            self._deleted.discard(key)
+        self.flush_if_due()
+
+    def __delitem__(self, key):
+        with self._lock:
+            in_memory = self._memory.pop(key, _missing) is not _missing
+            in_dirty = self._dirty.pop(key, _missing) is not _missing
+            self._last_used.pop(key, None)
+            if key in self._deleted or not (in_memory or in_dirty or key in self.backing):
+                raise KeyError(key)
+            self._deleted.add(key)
+        self.flush_if_due()
+
+    def bulk_delete(self, keys):
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+                self._dirty.pop(key, None)
+                self._last_used.pop(key, None)
+                self._deleted.add(key)
+        self.flush_if_due()
+
+    # Whole-table views (expiry sweeps, filter(), len) are rare, so they flush
+    # and then go to the backing store rather than being kept in memory.
+    def __iter__(self):
+        self.flush()
+        return iter(self.backing)
+
+    def __len__(self):
+        self.flush()
+        return len(self.backing)
+
+    def keys(self):
+        self.flush()
+        return self.backing.keys()
+
+    def values(self):
+        self.flush()
+        return self.backing.values()
+
+    def items(self):
+        self.flush()
+        return self.backing.items()
+
+    def count(self, *args, **kwargs):
+        self.flush()
+        return self.backing.count(*args, **kwargs)
+
+    def sorted(self, *args, **kwargs):
+        self.flush()
+        return self.backing.sorted(*args, **kwargs)
+
+    # forget what is cached in memory, after the table was changed on disk
+    # behind this dict's back (flush first, or pending writes are lost)
+    def invalidate(self):
+        with self._lock:
+            self._memory.clear()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._dirty.clear()
+            self._deleted.clear()
+            self._last_used.clear()
+            self.backing.clear()
+
+    def flush_if_due(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    # write every pending change to the backing store in one transaction
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._dirty and not self._deleted:
+                return
+            bulk_commit = getattr(self.backing, "bulk_commit", None)
+            if bulk_commit is not None:
+                with bulk_commit():
+                    self._write_pending()
+            else:
+                self._write_pending()
+            self.counters["flushes"] += 1
+
+    def _write_pending(self):
+        for key, value in self._dirty.items():
+            self.backing[key] = value
+        if self._deleted:
+            self.backing.bulk_delete(self._deleted)
+        self.counters["disk_writes"] += len(self._dirty) + len(self._deleted)
+        self._dirty.clear()
+        self._deleted.clear()
+
+    # unix time each key was last read or written by this process
+    def last_used(self, key):
+        return self._last_used.get(key, 0)
+
+    def pending(self):
+        with self._lock:
+            return len(self._dirty) + len(self._deleted)
+
+    def close(self):
+        self.flush()
+        self.backing.close()
+
+
+# requests_cache SQLite backend with a TieredDict in front of both of its
+# tables. Pending writes are flushed at interpreter exit.
+#
+# The file is kept bounded by maintain(): responses that expired more than
+# `keep_expired_for` seconds ago are dropped, then the least recently used
+# ones until the stored responses fit in `max_bytes`, and once a day, inside
+# the quiet hours, the file is VACUUMed to hand the freed pages back.
+class TieredSQLiteCache(SQLiteCache):
+    def __init__(self, db_path="http_cache", memory_entries=64, flush_interval=3600, **kwargs):
+        super().__init__(db_path, **kwargs)
+        self.responses = TieredDict(self.responses, memory_entries, flush_interval)
+        self.redirects = TieredDict(self.redirects, memory_entries, flush_interval)
+        self.last_vacuum = None
+        self.last_vacuum_seconds = None
+        atexit.register(self.flush)
+
+    def flush(self):
+        self.responses.flush()
+        self.redirects.flush()
+
+    # SQLiteCache deletes expired responses and orphaned redirects in SQL, so
+    # pending writes go to disk first and the memory tier is dropped after
+    def _delete_expired(self):
+        self.flush()
+        super()._delete_expired()
+        self.responses.invalidate()
+
+    def _prune_redirects(self):
+        self.flush()
+        super()._prune_redirects()
+        self.redirects.invalidate()
+
+    # hit/miss counters for each layer, summed over both tables
+    def stats(self):
+        totals = {}
+        for table in (self.responses, self.redirects):
+            for name, count in table.counters.items():
+                totals[name] = totals.get(name, 0) + count
+        totals["pending"] = self.responses.pending() + self.redirects.pending()
+        return totals
+
+    # (key, stored bytes, expires) for every response on disk
+    def _stored_responses(self):
+        backing = self.responses.backing
+        with backing.connection() as con:
+            return con.execute(
+                f"SELECT key, LENGTH(value), expires FROM {backing.table_name} ORDER BY expires"
+            ).fetchall()
+
+    # Drop long-expired responses, then least recently used ones until the
+    # rest fit in max_bytes. Returns (expired, evicted) counts.
+    def trim(self, max_bytes=None, keep_expired_for=0):
+        self.flush()
+        rows = self._stored_responses()
+
+        cutoff = time.time() - keep_expired_for
+        expired = [key for key, _, expires in rows if expires is not None and expires <= cutoff]
+        remaining = [(key, size) for key, size, expires in rows if expires is None or expires > cutoff]
+
+        evicted = []
+        if max_bytes is not None:
+            total = sum(size for _, size in remaining)
+            # never-used keys sort first, soonest to expire before later ones
+            for key, size in sorted(remaining, key=lambda row: self.responses.last_used(row[0])):
+                if total <= max_bytes:
+                    break
+                evicted.append(key)
+                total -= size
+
+        if expired or evicted:
+            self.responses.bulk_delete(expired + evicted)
+            # the deletes have to reach disk for the SQL prune to see them
+            self.flush()
+            self._prune_redirects()
+        return len(expired), len(evicted)
+
+    # VACUUM the file; returns how long it took
+    def compact(self):
+        self.flush()
+        start = time.perf_counter()
+        with self.responses.backing.connection():
+            self.responses.backing.vacuum()
+        self.last_vacuum = time.time()
+        self.last_vacuum_seconds = time.perf_counter() - start
+        return self.last_vacuum_seconds
+
+    # size of the file and of the responses stored in it
+    def footprint(self):
+        self.flush()
+        rows = self._stored_responses()
+        return {
+            "entries": len(rows),
+            "stored_bytes": sum(size for _, size, _ in rows),
+            "file_bytes": self.responses.size(),
+        }
+
+    # One maintenance pass: trim, VACUUM if inside `quiet_hours` (a local
+    # (start, end) hour range) and not done in the last 20 hours, and report
+    # the resulting footprint with this pass's timings.
+    def maintain(self, max_bytes=None, keep_expired_for=0, quiet_hours=(2, 5)):
+        start = time.perf_counter()
+        expired, evicted = self.trim(max_bytes, keep_expired_for)
+
+        vacuum_seconds = None
+        start_hour, end_hour = quiet_hours
+        quiet = start_hour <= datetime.now().hour < end_hour
+        if quiet and (self.last_vacuum is None or time.time() - self.last_vacuum > 20 * 3600):
+            vacuum_seconds = self.compact()
+
+        report = self.footprint()
+        report.update({
+            "expired": expired,
+            "evicted": evicted,
+            "vacuum_seconds": vacuum_seconds,
+            "last_vacuum": self.last_vacuum,
+            "last_vacuum_seconds": self.last_vacuum_seconds,
+            "maintenance_seconds": time.perf_counter() - start,
+        })
+        return report
+
+    def close(self):
+        self.flush()
+        super().close()
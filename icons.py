@@ -0,0 +1,64 @@
+from bisect import bisect_right
+
+from dash import html
+
+
+# Icon thresholds as sorted (upper bound, icon) tables. A value gets the
+# first icon whose bound it is below; anything at or above the last bound
+# gets the "Get inside!" warning instead.
+temperature_icons = [
+    (0, "fa-snowflake"),
+    (5, "fa-temperature-empty"),
+    (10, "fa-temperature-quarter"),
+    (20, "fa-temperature-half"),
+    (25, "fa-temperature-three-quarters"),
+    (30, "fa-temperature-full"),
+]
+
+# Precipitation picks a cloud cover table, which then picks the icon
+precipitation_icons = [
+    (1, [(5, "fa-sun"), (25, "fa-cloud-sun"), (float("inf"), "fa-cloud")]),
+    (2, [(25, "fa-cloud-sun-rain"), (float("inf"), "fa-cloud-rain")]),
+    (4, [(float("inf"), "fa-cloud-showers-heavy")]),
+    (8, [(float("inf"), "fa-cloud-showers-water")]),
+]
+
+
+# Every bucket's component is built once per display size and handed out
+# again on each render, so a refresh does no component or style allocation.
+class IconSet:
+    def __init__(self, size="fa-6x", warning_font_size="30px"):
+        self.size = size
+        self.warning = html.P("Get inside!", style={"fontSize": warning_font_size})
+
+        self._temperature_bounds = [bound for bound, _ in temperature_icons]
+        self._temperature = [self._icon(name) for _, name in temperature_icons] + [self.warning]
+
+        self._precipitation_bounds = [bound for bound, _ in precipitation_icons]
+        self._cloud = [
+            ([bound for bound, _ in cloud_icons], [self._icon(name) for _, name in cloud_icons])
+            for _, cloud_icons in precipitation_icons
+        ]
+
+    def _icon(self, name):
+        return html.I(className=f"fa-solid {name} {self.size}", style={"justifyContent": "center"})
+
+    def temperature(self, value):
+        return self._temperature[bisect_right(self._temperature_bounds, value)]
+
+    def cloud(self, precipitation=0, cloud_cover=0):
+        row = bisect_right(self._precipitation_bounds, precipitation)
+        if row == len(self._cloud):
+            return self.warning
+        bounds, icons = self._cloud[row]
+        return icons[bisect_right(bounds, cloud_cover)]
+
+    # every component this set can return, for checking the tables in one pass
+    def all_icons(self):
+        cloud = [icon for _, icons in self._cloud for icon in icons]
+        return self._temperature + cloud + [self.warning]
+
+
+# the two display sizes the dashboards use
+icons_6x = IconSet("fa-6x", warning_font_size="30px")
+icons_10x = IconSet("fa-10x", warning_font_size="40px")
@@ -6,8 +6,9 @@ import openmeteo_requests
 import requests_cache
 from retry_requests import retry
 
-# colour gradient
-import matplotlib.colors as mcolors
+# colour gradient and icons
+from colours import interpolate_colour
+from icons import icons_10x
 
 # dashboard
 import dash
@@ -39,41 +40,9 @@ def randint(min=0, max=30):
     a = random.randint(min, max)
     return a
 
-# use weather variables to choose background colours of cards
-def interpolate_colour(value,
-                       min_value=0,
-                       max_value=100,
-                       low_gradient = 'lightblue',
-                       high_gradient = 'red'):
-
-    # Normalize the value to be between 0 and 1
-    normalized_value = (value - min_value) / (max_value - min_value)
-
-    # Create color gradients from low to high
-    colour1 = mcolors.to_rgba(low_gradient)
-    colour2 = mcolors.to_rgba(high_gradient)
-
-    interpolated_colour = mcolors.to_hex(
-        [colour1[i] * (1 - normalized_value) + colour2[i] * normalized_value for i in range(4)]
-    )
-    return interpolated_colour
 
 # use weather variables to choose appropriate icons
-def map_temp_to_icon(value):
-    if value < 0:
-        return html.I(className="fa-solid fa-snowflake fa-10x", style={"justifyContent": "center"})
-    elif 0 <= value < 5:
-        return html.I(className="fa-solid fa-temperature-empty fa-10x", style={"justifyContent": "center"})
-    elif 5 <= value < 10:
-        return html.I(className="fa-solid fa-temperature-quarter fa-10x", style={"justifyContent": "center"})
-    elif 10 <= value < 20:
-        return html.I(className="fa-solid fa-temperature-half fa-10x", style={"justifyContent": "center"})
-    elif 20 <= value < 25:
-        return html.I(className="fa-solid fa-temperature-three-quarters fa-10x", style={"justifyContent": "center"})
-    elif 25 <= value < 30:
-        return html.I(className="fa-solid fa-temperature-full fa-10x", style={"justifyContent": "center"})
-    else:
-        return html.P("Get inside!", style={"fontSize": "40px"})
+map_temp_to_icon = icons_10x.temperature
 
 def map_rain_to_icon(value):
     if value == 0:
@@ -0,0 +1,214 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; upstream requests and callbacks both fall in this range
+default_buckets = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+size_buckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Histogram with one label. observe() is a bisect and three additions under
+# a lock, so it can sit in the request path.
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, label, buckets=default_buckets):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, label_value):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - start)
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        for label_value, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield self.name + "_bucket", [(self.label, label_value), ("le", _number(bound))], cumulative
+            yield self.name + "_sum", [(self.label, label_value)], total
+            yield self.name + "_count", [(self.label, label_value)], count
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, label):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_value, value in sorted(values.items()):
+            yield self.name, [(self.label, label_value)], value
+
+
+# Counter or gauge whose values are read at scrape time from `collect`, which
+# returns {label value: number} (or a bare number when `label` is None).
+# Nothing is recorded in the hot path for these.
+class Collected:
+    def __init__(self, name, help, kind, collect, label=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.label = label
+        self.collect = collect
+
+    def samples(self):
+        values = self.collect()
+        if values is None:
+            return
+        if self.label is None:
+            yield self.name, [], values
+            return
+        for label_value, value in sorted(values.items()):
+            if value is not None:
+                yield self.name, [(self.label, label_value)], value
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Metrics in Prometheus text exposition format (version 0.0.4).
+#
+# After share(), every worker process writes what it has collected to a
+# SharedSnapshotStore every few seconds, and a scrape of any worker renders
+# every live worker's metrics, each series labelled with its worker's pid.
+# So each scrape sees the same series whichever worker answers it, and the
+# fetching worker's upstream metrics are always there.
+class MetricsRegistry:
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+    prefix = "metrics-"
+
+    def __init__(self):
+        self._metrics = []
+        self._store = None
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, label, buckets=default_buckets):
+        return self.register(Histogram(name, help, label, buckets))
+
+    def counter(self, name, help, label):
+        return self.register(Counter(name, help, label))
+
+    def collected(self, name, help, kind, collect, label=None):
+        return self.register(Collected(name, help, kind, collect, label))
+
+    # {metric name: [(sample name, labels, value)], or an error message}
+    def collect(self):
+        families = {}
+        for metric in self._metrics:
+            try:
+                families[metric.name] = list(metric.samples())
+            except Exception as e:
+                # one broken collector shouldn't take the whole page down
+                families[metric.name] = f"unavailable: {e}"
+        return families
+
+    # share this process's metrics through `store`; call in each worker
+    def share(self, store, interval=5):
+        self._store = store
+        thread = threading.Thread(target=self._share, args=(interval,), name="metrics-share", daemon=True)
+        thread.start()
+
+    def _share(self, interval):
+        name = f"{self.prefix}{os.getpid()}"
+        while True:
+            try:
+                self._store.write(name, self.collect(), time.time())
+            except Exception as e:
+                print("Failed to share metrics:", e)
+            time.sleep(interval)
+
+    # {pid: families} of every live worker, this one collected fresh. Files
+    # left by workers that have exited are removed.
+    def _workers(self):
+        own = os.getpid()
+        workers = {own: self.collect()}
+        for name in self._store.names(self.prefix):
+            pid = int(name[len(self.prefix):])
+            if pid == own:
+                continue
+            if not _alive(pid):
+                self._store.discard(name)
+                continue
+            _, families, _ = self._store.read(name)
+            if families is not None:
+                workers[pid] = families
+        return workers
+
+    def render(self):
+        if self._store is None:
+            workers = {None: self.collect()}
+        else:
+            workers = self._workers()
+
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for worker, families in sorted(workers.items(), key=lambda item: item[0] or 0):
+                samples = families.get(metric.name, [])
+                if isinstance(samples, str):
+                    lines.append(f"# {metric.name} {_escape(samples)}")
+                    continue
+                worker_label = [("worker", worker)] if worker is not None else []
+                for name, labels, value in samples:
+                    lines.append(f"{name}{_labels(worker_label + labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
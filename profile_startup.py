@@ -0,0 +1,66 @@
+# Import-time breakdown for the dashboard process.
+#
+# Imports aggregated_live_dash in a fresh interpreter under `python -X importtime`
+# and reports how much import time each package costs (the self time of all
+# of its modules, wherever they were imported from), in lazy mode, eager
+# mode, or both side by side.
+#
+#   python profile_startup.py            # compare both modes
+#   python profile_startup.py --mode lazy --top 25
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+app_module = "aggregated_live_dash"
+
+
+# run the import once and return ({package: self microseconds}, wall seconds)
+def import_times(lazy, module=app_module):
+    env = dict(os.environ, SMART_SCREEN_LAZY_IMPORTS="1" if lazy else "0")
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    packages = {}
+    for line in result.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_time)
+    return packages, wall
+
+
+def report(lazy_times, eager_times, top):
+    names = sorted(set(lazy_times) | set(eager_times),
+                   key=lambda name: -max(lazy_times.get(name, 0), eager_times.get(name, 0)))
+    print(f"{'package':<30} {'lazy ms':>10} {'eager ms':>10}")
+    for name in names[:top]:
+        lazy_ms = lazy_times.get(name, 0) / 1000
+        eager_ms = eager_times.get(name, 0) / 1000
+        print(f"{name:<30} {lazy_ms:10.1f} {eager_ms:10.1f}")
+    print(f"{'total':<30} {sum(lazy_times.values()) / 1000:10.1f} {sum(eager_times.values()) / 1000:10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time breakdown of the dashboard")
+    parser.add_argument("--mode", choices=["lazy", "eager", "both"], default="both")
+    parser.add_argument("--top", type=int, default=15, help="number of packages to list")
+    args = parser.parse_args()
+
+    lazy_times, eager_times = {}, {}
+    if args.mode in ("lazy", "both"):
+        lazy_times, wall = import_times(lazy=True)
+        print(f"lazy:  interpreter start + import {wall:.2f}s")
+    if args.mode in ("eager", "both"):
+        eager_times, wall = import_times(lazy=False)
+        print(f"eager: interpreter start + import {wall:.2f}s")
+    report(lazy_times, eager_times, args.top)
@@ -0,0 +1,145 @@
+import cProfile
+import functools
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+# SMART_SCREEN_PROFILE=sample|cprofile turns profiling on from startup
+# SMART_SCREEN_PROFILE_DIR is where the output goes (default ./profiles)
+# SMART_SCREEN_PROFILE_TARGETS limits it to some targets, comma separated
+modes = ("sample", "cprofile")
+
+
+# Folded stacks ("outer;inner;leaf count" per line) of one thread, sampled
+# from another thread every `interval` seconds. Feeds flamegraph.pl,
+# inferno or speedscope directly.
+class StackSampler:
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self._thread.join()
+        return self.stacks
+
+
+# Profiles selected callbacks and fetchers, one output file per invocation.
+# "sample" writes folded stacks (<target>-<time>-<pid>-<n>.folded);
+# "cprofile" runs the deterministic profiler and writes pstats (.prof).
+# While disabled, a profiled call costs one attribute check.
+class Profiler:
+    def __init__(self, mode=None, directory="profiles", targets=None, interval=0.001):
+        self.directory = directory
+        self.interval = interval
+        self.mode = None
+        self.targets = None
+        self._count = itertools.count()
+        self.configure(mode, targets)
+
+    @classmethod
+    def from_environment(cls):
+        targets = os.environ.get("SMART_SCREEN_PROFILE_TARGETS")
+        return cls(
+            mode=os.environ.get("SMART_SCREEN_PROFILE") or None,
+            directory=os.environ.get("SMART_SCREEN_PROFILE_DIR", "profiles"),
+            targets=[target.strip() for target in targets.split(",")] if targets else None,
+        )
+
+    # mode None switches profiling off; targets None profiles every target
+    def configure(self, mode, targets=None):
+        if mode is not None and mode not in modes:
+            raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {', '.join(modes)}")
+        self.targets = set(targets) if targets else None
+        self.mode = mode
+
+    @property
+    def enabled(self):
+        return self.mode is not None
+
+    def wants(self, target):
+        return self.mode is not None and (self.targets is None or target in self.targets)
+
+    # Start profiling the current thread for `target`. Returns a session for
+    # stop(), or None if the target isn't selected or (cProfile only) another
+    # profile is already running.
+    def start(self, target):
+        mode = self.mode
+        if not self.wants(target):
+            return None
+        if mode == "sample":
+            return target, mode, StackSampler(threading.get_ident(), self.interval)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # only one cProfile can be active at a time
+            return None
+        return target, mode, profile
+
+    # stop a session from start() and write its output; returns the path
+    def stop(self, session):
+        if session is None:
+            return None
+        target, mode, profiler = session
+        if mode == "sample":
+            stacks = profiler.stop()
+        else:
+            profiler.disable()
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r"[^\w.-]+", "_", target)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self.directory, f"{name}-{stamp}-{os.getpid()}-{next(self._count)}")
+        if mode == "sample":
+            path += ".folded"
+            with open(path, "w") as f:
+                for stack, count in stacks.items():
+                    f.write(f"{stack} {count}\n")
+        else:
+            path += ".prof"
+            profiler.dump_stats(path)
+        return path
+
+    # decorator for a function profiled under `target` (default: its name)
+    def profiled(self, target=None):
+        def decorate(function):
+            name = target or function.__name__
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if self.mode is None:
+                    return function(*args, **kwargs)
+                session = self.start(name)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.stop(session)
+            return wrapper
+        return decorate
+
+    def status(self):
+        return {
+            "mode": self.mode,
+            "targets": sorted(self.targets) if self.targets else None,
+            "directory": os.path.abspath(self.directory),
+        }
@@ -0,0 +1,167 @@
+import fcntl
+import mmap
+import os
+import pickle
+import re
+import struct
+import tempfile
+import threading
+
+# version, publish time and payload length at the start of every file
+_header = struct.Struct("<QdQ")
+_header_size = 64
+
+
+# One source's latest value in a memory-mapped file, shared by every worker
+# on the host. The writer replaces the pickled value under an exclusive
+# flock and bumps the version in the header; readers check the header
+# straight from the mapping and only lock and unpickle when the version has
+# changed, so an unchanged snapshot costs one header read. touch() moves the
+# publish time on without a new version, for a refresh that found nothing new.
+#
+# Values are pickled, so each worker holds its own decoded copy of every
+# version it reads. That is one copy of a weather snapshot and a bus board
+# (tens of KB) per worker, not per request. Handing out views straight into
+# the mapping would need double-buffered files so the writer never
+# overwrites a version a reader still holds.
+class SharedSnapshot:
+    def __init__(self, path, capacity=8 * 1024 * 1024):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        # sparse, so untouched capacity takes no memory or disk
+        if os.fstat(self._fd).st_size < _header_size + capacity:
+            os.ftruncate(self._fd, _header_size + capacity)
+        self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+        self.capacity = len(self._map) - _header_size
+
+        self._seen = None
+        self._value = None
+        self._published_at = None
+
+    # 0 until something has been written
+    def version(self):
+        return _header.unpack_from(self._map, 0)[0]
+
+    # publish a new value; returns its version
+    def write(self, value, published_at):
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.capacity:
+            raise ValueError(f"Snapshot of {len(payload)} bytes does not fit in {self.path} ({self.capacity} bytes)")
+
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            version = self.version() + 1
+            self._map[_header_size:_header_size + len(payload)] = payload
+            _header.pack_into(self._map, 0, version, published_at, len(payload))
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return version
+
+    # mark the current value as published again at `published_at`
+    def touch(self, published_at):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            version, _, length = _header.unpack_from(self._map, 0)
+            _header.pack_into(self._map, 0, version, published_at, length)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # (version, value, published_at), unpickling only when the version changed.
+    # Version 0 means nothing has been published yet.
+    def read(self):
+        version, published_at, _ = _header.unpack_from(self._map, 0)
+        if version == self._seen:
+            self._published_at = published_at
+            return self._seen, self._value, self._published_at
+
+        fcntl.flock(self._fd, fcntl.LOCK_SH)
+        try:
+            version, published_at, length = _header.unpack_from(self._map, 0)
+            value = None
+            if version:
+                with memoryview(self._map)[_header_size:_header_size + length] as payload:
+                    value = pickle.loads(payload)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+        self._seen, self._value, self._published_at = version, value, published_at
+        return version, value, published_at
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+# Shared snapshots, one file per source (opened on first use), plus the
+# lock that picks which process fetches. Every worker opens the same
+# directory; the one holding the lock fetches and writes, the others only
+# read. The kernel releases the lock when its holder exits, so another
+# worker can take over.
+class SharedSnapshotStore:
+    def __init__(self, directory, capacity=8 * 1024 * 1024):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.capacity = capacity
+        self.snapshots = {}
+        self._snapshots_lock = threading.Lock()
+        self._lock_fd = os.open(os.path.join(directory, "fetcher.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        self.leader = False
+
+    # become the fetching process if nobody else is; never blocks
+    def try_lead(self):
+        if not self.leader:
+            try:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self.leader = True
+            except BlockingIOError:
+                pass
+        return self.leader
+
+    def snapshot(self, name):
+        with self._snapshots_lock:
+            if name not in self.snapshots:
+                self.snapshots[name] = SharedSnapshot(os.path.join(self.directory, f"{name}.snapshot"), self.capacity)
+            return self.snapshots[name]
+
+    # names of the snapshots in the directory that start with `prefix`,
+    # including ones other processes created
+    def names(self, prefix=""):
+        return [entry[:-len(".snapshot")] for entry in os.listdir(self.directory)
+                if entry.startswith(prefix) and entry.endswith(".snapshot")]
+
+    # close and delete a snapshot nobody will write again
+    def discard(self, name):
+        with self._snapshots_lock:
+            snapshot = self.snapshots.pop(name, None)
+        if snapshot is not None:
+            snapshot.close()
+        try:
+            os.remove(os.path.join(self.directory, f"{name}.snapshot"))
+        except FileNotFoundError:
+            pass
+
+    def write(self, name, value, published_at):
+        return self.snapshot(name).write(value, published_at)
+
+    def touch(self, name, published_at):
+        self.snapshot(name).touch(published_at)
+
+    def read(self, name):
+        return self.snapshot(name).read()
+
+    def close(self):
+        for snapshot in self.snapshots.values():
+            snapshot.close()
+        os.close(self._lock_fd)
+
+
+# /dev/shm keeps the files in RAM (and off the SD card) where it exists.
+# One directory per user and `namespace` (the server's bind address), so
+# separate servers on the host, like a benchmark next to the real dashboard,
+# never share snapshots or a fetcher.
+def default_snapshot_dir(namespace=""):
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    name = f"smart_screen-{os.getuid()}"
+    if namespace:
+        name += "-" + re.sub(r"[^\w.-]+", "_", namespace)
+    return os.path.join(base, name)
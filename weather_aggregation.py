@@ -0,0 +1,43 @@
+import numpy as np
+
+seconds_per_day = 86400
+
+
+# Start index of each local day in an evenly spaced series, plus the unix
+# time at which each of those days starts. Day boundaries come straight from
+# the response's Time(), Interval() and UtcOffsetSeconds().
+def day_segments(start_time, interval, length, utc_offset_seconds=0):
+    times = start_time + interval * np.arange(length, dtype=np.int64)
+    days = (times + utc_offset_seconds) // seconds_per_day
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    return starts, days[starts] * seconds_per_day - utc_offset_seconds
+
+
+# Daily mean, min, max and sum of any number of hourly variables, computed
+# together as segment reductions over a (variables x hours) array.
+# Missing (NaN) hours are skipped, as pandas' resample('D') does: a day with
+# no data has a NaN mean/min/max and a sum of 0.
+def daily_aggregates(start_time, interval, hourly, utc_offset_seconds=0):
+    names = list(hourly)
+    if not names:
+        return {"time": np.array([], dtype=np.int64)}
+
+    values = np.vstack([np.asarray(hourly[name], dtype=np.float64) for name in names])
+    starts, day_times = day_segments(start_time, interval, values.shape[1], utc_offset_seconds)
+
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid, starts, axis=1)
+    sums = np.add.reduceat(np.where(valid, values, 0), starts, axis=1)
+    empty = counts == 0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    mins = np.minimum.reduceat(np.where(valid, values, np.inf), starts, axis=1)
+    maxs = np.maximum.reduceat(np.where(valid, values, -np.inf), starts, axis=1)
+    mins[empty] = np.nan
+    maxs[empty] = np.nan
+
+    result = {"time": day_times}
+    for i, name in enumerate(names):
+        result[name] = {"mean": means[i], "min": mins[i], "max": maxs[i], "sum": sums[i]}
+    return result
@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# One decoded Open-Meteo response, with every variable keyed by the name it
+# was requested under. Built once per fetch and shared by every page.
+@dataclass(frozen=True)
+class WeatherSnapshot:
+    latitude: float
+    longitude: float
+    utc_offset_seconds: int
+    current_time: int
+    current: dict
+    daily_time: int
+    daily_interval: int
+    daily: dict
+    hourly_time: int
+    hourly_interval: int
+    hourly: dict
+
+
+# Open-Meteo accepts either a single variable name or a list of them
+def variable_names(params, section):
+    names = params.get(section, [])
+    if isinstance(names, str):
+        return [names]
+    return list(names)
+
+
+# The response lists variables in the same order they were requested,
+# so the positional lookups only ever happen here
+def decode_weather_response(response, params):
+    current_names = variable_names(params, "current")
+    daily_names = variable_names(params, "daily")
+    hourly_names = variable_names(params, "hourly")
+
+    current = response.Current() if current_names else None
+    daily = response.Daily() if daily_names else None
+    hourly = response.Hourly() if hourly_names else None
+
+    return WeatherSnapshot(
+        latitude=response.Latitude(),
+        longitude=response.Longitude(),
+        utc_offset_seconds=response.UtcOffsetSeconds(),
+        current_time=current.Time() if current else 0,
+        current={name: current.Variables(i).Value() for i, name in enumerate(current_names)},
+        daily_time=daily.Time() if daily else 0,
+        daily_interval=daily.Interval() if daily else 0,
+        daily={name: np.asarray(daily.Variables(i).ValuesAsNumpy()) for i, name in enumerate(daily_names)},
+        hourly_time=hourly.Time() if hourly else 0,
+        hourly_interval=hourly.Interval() if hourly else 0,
+        hourly={name: np.asarray(hourly.Variables(i).ValuesAsNumpy()) for i, name in enumerate(hourly_names)},
+    )
+
+
+# A request for several locations returns one response per location, in the
+# order the coordinates were given. Fan them out by location name.
+def decode_weather_responses(responses, params, location_names):
+    if len(responses) != len(location_names):
+        raise ValueError(f"Expected {len(location_names)} weather responses, got {len(responses)}")
+    return {name: decode_weather_response(response, params)
+            for name, response in zip(location_names, responses)}
@@ -0,0 +1,16 @@
+# Production entry point: the dashboard's Flask server for a WSGI server.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:server
+#
+# gunicorn.conf.py preloads this module in the master process, so the app
+# and every heavy module are imported once and shared copy-on-write by the
+# workers. Nothing here opens a connection or starts a thread: each worker
+# starts its poller after the fork, and only the worker that fetches for the
+# others builds the HTTP cache.
+import aggregated_live_dash
+
+# import what lazy mode would otherwise import on the first fetch or callback
+aggregated_live_dash.preload_heavy_modules()
+
+app = aggregated_live_dash.app
+server = app.server